@@ -0,0 +1,38 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+DATA = os.path.join(os.path.dirname(__file__), "..", "..", "data")
+
+#: site constants of the bundled tower data
+SITE = dict(instrument_height=2.53, roughness_length=0.0206)
+
+
+def load(name: str = "demo") -> pd.DataFrame:
+    """One of the bundled data files: ``demo``, ``neutral_test``,
+    ``stable_test`` or ``unstable_test``."""
+    return pd.read_csv(os.path.join(DATA, f"{name}.csv"), parse_dates=["datetime"])
+
+
+def series(rows: int, name: str = "demo") -> dict:
+    """Measurement and site arguments of :func:`calc_footprint` for ``rows``
+    half-hours, cycling through the rows of a bundled file."""
+    df = load(name)
+    df = df.iloc[np.arange(rows) % len(df)]
+    return dict(
+        air_pressure=df["air_pressure"].to_numpy(),
+        air_temperature=df["air_temperature"].to_numpy(),
+        friction_velocity=df["friction_velocity"].to_numpy(),
+        wind_speed=df["wind_speed"].to_numpy(),
+        cross_wind_variance=df["v_var"].to_numpy(),
+        wind_direction=df["wind_dir"].to_numpy(),
+        monin_obukhov_length=df["L"].to_numpy(),
+        time=pd.date_range("2020-07-01", periods=rows, freq="30min").to_numpy(),
+        **SITE,
+    )
+
+
+def dense_bytes(rows: int, domain_length: int, resolution: int) -> int:
+    """Size of the dense (time, x, y) float64 output."""
+    return rows * (2 * domain_length // resolution) ** 2 * 8
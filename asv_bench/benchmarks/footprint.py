@@ -0,0 +1,224 @@
+"""Benchmarks of :func:`eddy_footprint.calc_footprint` and its stages.
+
+Run from ``asv_bench/`` with ``asv run``, and check a change for regressions
+against the stored results of ``main`` with
+``asv continuous --factor 1.2 main HEAD`` (or ``asv compare`` between two
+stored runs), which fails when any timing or peak memory grows by more than
+the factor.
+"""
+
+import numpy as np
+from eddy_footprint import calc_footprint
+from eddy_footprint.models import MODELS
+from eddy_footprint.core import build_dataset
+
+from . import SITE, dense_bytes, series
+
+METHODS = ["Hsieh", "Kormann & Meixner"]
+GRIDS = ["200/5", "1000/10", "1000/5"]
+
+#: dense outputs beyond this are skipped rather than swapping
+MAX_DENSE_BYTES = 2**30
+
+
+def grid(name):
+    domain_length, resolution = (int(value) for value in name.split("/"))
+    return dict(domain_length=domain_length, resolution=resolution)
+
+
+class CalcFootprint:
+    """Dense footprints by method, grid, record length and resampling."""
+
+    params = (METHODS, GRIDS, [1, 100, 1000], ["xarray", "numpy"], ["idw", "bilinear"])
+    param_names = ["method", "grid", "rows", "engine", "resampling"]
+    timeout = 600
+
+    def setup(self, method, grid_name, rows, engine, resampling):
+        if dense_bytes(rows, **grid(grid_name)) > MAX_DENSE_BYTES:
+            raise NotImplementedError()
+        if engine == "xarray" and rows > 100:
+            # the per-timestep engine is covered at small record lengths
+            raise NotImplementedError()
+        self.kwargs = dict(
+            series(rows),
+            method=method,
+            engine=engine,
+            resampling=resampling,
+            **grid(grid_name),
+        )
+
+    def time_calc_footprint(self, *args):
+        calc_footprint(**self.kwargs)
+
+    def peakmem_calc_footprint(self, *args):
+        calc_footprint(**self.kwargs)
+
+
+class Resampling:
+    """Resampling engines on the demo record."""
+
+    params = (["idw", "bilinear", "nearest"], [None, 1])
+    param_names = ["resampling", "direction_step"]
+
+    def setup(self, resampling, direction_step):
+        self.kwargs = dict(
+            series(47),
+            engine="numpy",
+            resampling=resampling,
+            direction_step=direction_step,
+            domain_length=500,
+            resolution=5,
+        )
+
+    def time_calc_footprint(self, *args):
+        calc_footprint(**self.kwargs)
+
+
+class LongRecord:
+    """Reductions that stay in bounded memory up to 10k half-hours."""
+
+    params = (METHODS, [1000, 10000], ["climatology", "statistics"])
+    param_names = ["method", "rows", "output"]
+    timeout = 1200
+
+    def setup(self, method, rows, output):
+        self.kwargs = dict(
+            series(rows),
+            method=method,
+            engine="numpy",
+            resampling="bilinear",
+            domain_length=500,
+            resolution=5,
+        )
+        self.kwargs[output] = "all" if output == "climatology" else [0.5, 0.9]
+
+    def time_calc_footprint(self, *args):
+        calc_footprint(**self.kwargs)
+
+    def peakmem_calc_footprint(self, *args):
+        calc_footprint(**self.kwargs)
+
+
+class Workers:
+    """Parallel chunks on process and thread pools."""
+
+    params = ([1, 2, 4], ["thread", "process"])
+    param_names = ["workers", "executor"]
+    timeout = 1200
+
+    def setup(self, workers, executor):
+        self.kwargs = dict(
+            series(1000),
+            engine="numpy",
+            resampling="bilinear",
+            domain_length=500,
+            resolution=5,
+            climatology="all",
+            workers=workers,
+            executor=executor,
+        )
+
+    def time_calc_footprint(self, *args):
+        calc_footprint(**self.kwargs)
+
+
+class KDTreeWorkers:
+    """Workers of the KDTree query of ``idw`` resampling, without a pool."""
+
+    params = ([1, 2, 4], ["xarray", "numpy"])
+    param_names = ["workers", "engine"]
+
+    def setup(self, workers, engine):
+        self.kwargs = dict(
+            series(47),
+            engine=engine,
+            resampling="idw",
+            domain_length=500,
+            resolution=5,
+            workers=workers,
+        )
+
+    def time_calc_footprint(self, *args):
+        calc_footprint(**self.kwargs)
+
+
+class Stability:
+    """Each stability class of the bundled test files."""
+
+    params = (METHODS, ["neutral_test", "stable_test", "unstable_test"])
+    param_names = ["method", "data"]
+
+    def setup(self, method, data):
+        self.kwargs = dict(series(3, data), method=method, resampling="bilinear")
+
+    def time_calc_footprint(self, *args):
+        calc_footprint(**self.kwargs)
+
+
+class Stages:
+    """The stages of the numpy engine for one block of timesteps."""
+
+    params = (METHODS, GRIDS)
+    param_names = ["method", "grid"]
+
+    def setup(self, method, grid_name):
+        kwargs = series(16)
+        ds = build_dataset(
+            **{name: value for name, value in kwargs.items() if name not in SITE}
+        )
+        self.model = MODELS[method](ds, **SITE, workers=1, **grid(grid_name))
+        self.values = {name: self.model.ds[name].data for name in self.model.parameters}
+        self.Fxy = self.model.calc_model_frame(self.values)
+        self.wind_direction = self.model.ds["wind_direction"].data
+        self.model.resampling = "bilinear"
+
+    def time_build_model(self, method, grid_name):
+        MODELS[method](self.model.ds, **SITE, workers=1, **grid(grid_name))
+
+    def time_calc_parameters(self, *args):
+        self.model.calc_parameters()
+
+    def time_model_frame(self, *args):
+        self.model.calc_model_frame(self.values)
+
+    def time_resample_idw(self, *args):
+        self.model.resampling = "idw"
+        self.model.normalize_block(self.Fxy, wind_direction=self.wind_direction)
+
+    def time_resample_bilinear(self, *args):
+        self.model.resampling = "bilinear"
+        self.model.normalize_block(self.Fxy, wind_direction=self.wind_direction)
+
+    def peakmem_model_frame(self, *args):
+        self.model.calc_model_frame(self.values)
+
+
+class Ensemble:
+    """Monte Carlo ensembles of perturbed friction velocity."""
+
+    params = (METHODS, [10, 100], [None, [0.5, 0.9]])
+    param_names = ["method", "members", "levels"]
+
+    def setup(self, method, members, levels):
+        self.kwargs = dict(
+            series(3), method=method, resampling="bilinear", domain_length=500
+        )
+        self.ensemble = {"friction_velocity": 0.05}
+        self.options = dict(members=members, seed=0, statistics=levels)
+
+    def time_calc_ensemble(self, *args):
+        calc_footprint(**self.kwargs, ensemble=self.ensemble, **self.options)
+
+
+def track_model_frame_cells(*args):
+    """Cells of the default model-frame grid, as a guard on its size."""
+    model = MODELS["Hsieh"](
+        build_dataset(
+            **{name: value for name, value in series(1).items() if name not in SITE}
+        ),
+        **SITE,
+        workers=1,
+        domain_length=1000,
+        resolution=5,
+    )
+    return int(np.prod(list(model.domain.sizes.values())))
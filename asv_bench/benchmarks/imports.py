@@ -0,0 +1,17 @@
+"""Import time of the package, as paid by every new worker process.
+
+``timeraw_`` benchmarks run their code in a fresh interpreter, so nothing is
+already imported.
+"""
+
+
+def timeraw_import_package():
+    return "import eddy_footprint"
+
+
+def timeraw_import_calc_footprint():
+    return "from eddy_footprint import calc_footprint"
+
+
+def timeraw_import_models():
+    return "import eddy_footprint.models"
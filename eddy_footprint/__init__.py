@@ -1,10 +1,55 @@
-from importlib.metadata import PackageNotFoundError as _PackageNotFoundError
-from importlib.metadata import version as _version
+from importlib import import_module as _import_module
+from typing import TYPE_CHECKING
 
-try:
-    __version__ = _version(__name__)
-except _PackageNotFoundError:
-    # package is not installed
-    __version__ = "unknown"
+# the public API is imported from its submodule on first access, so that
+# importing the package (e.g. in short-lived worker processes) does not load
+# xarray, pandas or scipy until they are used
+_LAZY_IMPORTS = {
+    "calc_footprint": "eddy_footprint.core",
+    "iter_footprints": "eddy_footprint.core",
+    "FootprintCache": "eddy_footprint.models",
+    "ParametricFootprints": "eddy_footprint.parametric",
+    "FootprintProfile": "eddy_footprint.profiling",
+    "SparseFootprints": "eddy_footprint.sparse",
+    "FootprintSession": "eddy_footprint.session",
+    "calc_sites": "eddy_footprint.sites",
+    "TargetGrid": "eddy_footprint.spatial",
+}
 
-from eddy_footprint.core import calc_footprint  # noqa: F401
+__all__ = list(_LAZY_IMPORTS)
+
+if TYPE_CHECKING:
+    from eddy_footprint.core import calc_footprint, iter_footprints  # noqa: F401
+    from eddy_footprint.models import FootprintCache  # noqa: F401
+    from eddy_footprint.parametric import ParametricFootprints  # noqa: F401
+    from eddy_footprint.profiling import FootprintProfile  # noqa: F401
+    from eddy_footprint.sparse import SparseFootprints  # noqa: F401
+    from eddy_footprint.session import FootprintSession  # noqa: F401
+    from eddy_footprint.sites import calc_sites  # noqa: F401
+    from eddy_footprint.spatial import TargetGrid  # noqa: F401
+
+
+def _package_version() -> str:
+    from importlib.metadata import PackageNotFoundError, version
+
+    try:
+        return version(__name__)
+    except PackageNotFoundError:
+        # package is not installed
+        return "unknown"
+
+
+def __getattr__(name):
+    if name == "__version__":
+        globals()[name] = _package_version()
+        return globals()[name]
+    if name in _LAZY_IMPORTS:
+        value = getattr(_import_module(_LAZY_IMPORTS[name]), name)
+        # cached, so that later lookups do not go through __getattr__
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
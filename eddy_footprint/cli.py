@@ -0,0 +1,310 @@
+"""Command-line batch processing of flux tower CSV files.
+
+Usage::
+
+    eddy-footprint CONFIG INPUT [INPUT ...] --output PATH [--kind KIND]
+
+``CONFIG`` is a JSON file with the site constants, the CSV column of each
+measurement and options of :func:`calc_footprint`, e.g.::
+
+    {
+        "instrument_height": 2.53,
+        "roughness_length": 0.0206,
+        "columns": {
+            "time": "datetime",
+            "cross_wind_variance": "v_var",
+            "wind_direction": "wind_dir",
+            "sensible_heat_flux": "H"
+        },
+        "options": {"domain_length": 500, "resampling": "bilinear"},
+        "read_csv": {"na_values": "NA"}
+    }
+
+Measurements whose column is not mapped are read from the column of the same
+name. Without a ``monin_obukhov_length`` column, L is derived from the air
+pressure and temperature, friction velocity and ``sensible_heat_flux`` (see
+:func:`calc_monin_obukhov_length`). A ``weights`` column weights climatologies.
+``read_csv`` holds further arguments of :func:`pandas.read_csv` and
+``time_format`` the format of the time column.
+
+Outputs are written with zarr, and NetCDF climatologies with netCDF4, which are
+installed with the ``cli`` extra: ``pip install "eddy-footprint[cli]"``.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time as timer
+from typing import Iterator, Optional, Sequence
+
+import pandas as pd
+from eddy_footprint.climatology import merge_climatologies
+from eddy_footprint.core import (
+    MEASUREMENTS,
+    calc_footprint,
+    calc_monin_obukhov_length,
+    iter_footprints,
+)
+from eddy_footprint.sparse import SparseFootprints
+from eddy_footprint.store import append_to_zarr, is_netcdf
+
+logger = logging.getLogger(__name__)
+
+OUTPUT_KINDS = ("dense", "sparse", "climatology")
+
+#: options of :func:`calc_footprint` that select an output kind other than dense
+KIND_OPTIONS = {
+    "cutoff": "sparse",
+    "sparse_format": "sparse",
+    "climatology": "climatology",
+}
+
+#: options of :func:`calc_footprint` for outputs the command line does not write;
+#: climatology weights are read from the ``weights`` column
+UNSUPPORTED_OPTIONS = (
+    "parametric",
+    "statistics",
+    "store",
+    "target",
+    "pyramid",
+    "ensemble",
+    "members",
+    "seed",
+    "weights",
+)
+
+
+def read_chunks(
+    paths: Sequence[str], *, chunk_rows: int, read_csv: Optional[dict] = None
+) -> Iterator[pd.DataFrame]:
+    """Yield the rows of one or more CSV files in chunks of up to
+    ``chunk_rows``, one file after the other."""
+    for path in paths:
+        yield from pd.read_csv(path, chunksize=chunk_rows, **(read_csv or {}))
+
+
+def measurements(
+    df: pd.DataFrame, *, columns: Optional[dict] = None, time_format=None
+) -> dict:
+    """Measurement arguments of :func:`calc_footprint` (and ``weights``, if
+    mapped) from a chunk of CSV rows, deriving the Monin-Obukhov length when
+    it has no column."""
+    columns = {name: name for name in MEASUREMENTS} | dict(columns or {})
+    values = {}
+    for name in MEASUREMENTS:
+        if columns[name] in df.columns:
+            values[name] = df[columns[name]].to_numpy()
+        elif name != "monin_obukhov_length":
+            raise ValueError(f"Column {columns[name]!r} of {name} is missing.")
+    values["time"] = pd.to_datetime(values["time"], format=time_format).to_numpy()
+    if "monin_obukhov_length" not in values:
+        heat_flux = columns.get("sensible_heat_flux", "sensible_heat_flux")
+        if heat_flux not in df.columns:
+            raise ValueError(
+                "Deriving the Monin-Obukhov length requires a sensible heat flux "
+                f"column, but {heat_flux!r} is missing."
+            )
+        values["monin_obukhov_length"] = calc_monin_obukhov_length(
+            air_pressure=values["air_pressure"],
+            air_temperature=values["air_temperature"],
+            friction_velocity=values["friction_velocity"],
+            sensible_heat_flux=df[heat_flux].to_numpy(),
+        )
+    if "weights" in columns:
+        values["weights"] = df[columns["weights"]].to_numpy()
+    return values
+
+
+def process(
+    config: dict,
+    paths: Sequence[str],
+    *,
+    output: str,
+    kind: Optional[str] = None,
+    chunk_rows: int = 10000,
+    **options,
+) -> dict:
+    """Compute the footprints of the rows of CSV files chunk by chunk and
+    write them to ``output``.
+
+    Parameters
+    ----------
+    config : dict
+        Site constants, ``columns``, ``options``, ``read_csv`` and
+        ``time_format``, as described in :mod:`eddy_footprint.cli`.
+    paths : sequence of str
+        CSV files, processed in order.
+    output : str
+        Path of the output. ``dense`` footprints are appended to a Zarr store
+        one model chunk at a time. ``sparse`` footprints (with ``cutoff``) are
+        appended to a Zarr store one row chunk at a time. A ``climatology`` is
+        written once all rows are folded in, as NetCDF if the path ends in
+        ``.nc`` or ``.nc4`` and as Zarr otherwise. The output must not exist.
+    kind : ``dense``, ``sparse`` or ``climatology``, optional
+        What is written. Default: ``sparse`` with a ``cutoff`` option,
+        ``climatology`` with a ``climatology`` option and dense otherwise.
+    chunk_rows : int, optional
+        Number of CSV rows read and computed at a time. Default: 10000.
+    **options
+        Options of :func:`calc_footprint` that take precedence over those of
+        the config, e.g. ``workers`` and ``executor``.
+
+    Returns
+    -------
+    summary: dict
+        Number of ``rows`` processed, ``seconds`` taken and ``rows_per_second``.
+    """
+    options = {**config.get("options", {}), **options}
+    unsupported = [name for name in UNSUPPORTED_OPTIONS if name in options]
+    if unsupported:
+        raise ValueError(
+            f"Options {unsupported} are not supported on the command line."
+        )
+    kinds = {
+        name: option_kind
+        for name, option_kind in KIND_OPTIONS.items()
+        if options.get(name) is not None
+    }
+    if kind is None:
+        inferred = set(kinds.values())
+        kind = inferred.pop() if len(inferred) == 1 else "dense"
+    if kind not in OUTPUT_KINDS:
+        raise ValueError(
+            f"Unknown output kind {kind!r}, expected one of {OUTPUT_KINDS}."
+        )
+    for name, option_kind in kinds.items():
+        if option_kind != kind:
+            raise ValueError(f"{name} does not apply to {kind} output.")
+    if os.path.exists(output):
+        raise FileExistsError(f"{output} already exists.")
+    if kind != "climatology" and is_netcdf(output):
+        raise ValueError(f"{kind} footprints are written to Zarr, not to {output}.")
+    if kind == "sparse":
+        options.setdefault("cutoff", 0.9)
+    if kind == "climatology":
+        options.setdefault("climatology", "all")
+    site = dict(
+        instrument_height=config["instrument_height"],
+        roughness_length=config["roughness_length"],
+    )
+    chunks = read_chunks(paths, chunk_rows=chunk_rows, read_csv=config.get("read_csv"))
+    rows = 0
+    written = False
+    climatology = None
+    start = timer.perf_counter()
+    for i, df in enumerate(chunks):
+        chunk_start = timer.perf_counter()
+        values = measurements(
+            df, columns=config.get("columns"), time_format=config.get("time_format")
+        )
+        weights = values.pop("weights", None)
+        if kind == "dense":
+            footprints = iter_footprints(
+                **values,
+                **site,
+                **{**options, "chunk_size": options.get("chunk_size", 64)},
+            )
+            for da in footprints:
+                append_to_zarr(da, output, exists=written)
+                written = True
+        elif kind == "sparse":
+            sparse = calc_footprint(**values, **site, **options)
+            write_sparse(sparse, output, append=written)
+            written = True
+        else:
+            da = calc_footprint(**values, **site, **options, weights=weights)
+            climatology = (
+                da if climatology is None else merge_climatologies(climatology, da)
+            )
+        rows += len(df)
+        seconds = timer.perf_counter() - chunk_start
+        logger.info(
+            f"chunk {i}: {len(df)} rows in {seconds:.2f} s "
+            f"({len(df) / seconds:.1f} rows/s)"
+        )
+    if rows == 0:
+        raise ValueError("No rows to process.")
+    if climatology is not None:
+        if is_netcdf(output):
+            climatology.to_dataset(name="footprint").to_netcdf(output)
+        else:
+            climatology.to_dataset(name="footprint").to_zarr(output, mode="w-")
+    seconds = timer.perf_counter() - start
+    summary = dict(rows=rows, seconds=seconds, rows_per_second=rows / seconds)
+    logger.info(
+        f"{rows} rows in {seconds:.2f} s ({summary['rows_per_second']:.1f} rows/s)"
+    )
+    return summary
+
+
+def write_sparse(sparse: SparseFootprints, store, *, append: bool):
+    """Write sparse footprints to a Zarr store, or append them to the sparse
+    footprints of earlier timesteps in it, so that
+    ``SparseFootprints(xr.open_zarr(store))`` reads all of them."""
+    steps = sparse.ds.drop_dims("cell")
+    cells = sparse.ds.drop_dims("time").drop_vars(["x", "y"])
+    if append:
+        steps.drop_vars(["x", "y"]).to_zarr(store, append_dim="time")
+        cells.to_zarr(store, append_dim="cell")
+    else:
+        steps.to_zarr(store, mode="w-")
+        cells.to_zarr(store, mode="a")
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    parser = argparse.ArgumentParser(
+        prog="eddy-footprint",
+        description="Compute flux footprints of flux tower CSV files.",
+    )
+    parser.add_argument("config", help="JSON file with the site and column mapping.")
+    parser.add_argument("inputs", nargs="+", help="CSV files, processed in order.")
+    parser.add_argument("-o", "--output", required=True, help="Output path.")
+    parser.add_argument(
+        "--kind",
+        choices=OUTPUT_KINDS,
+        help="Output kind. Default: sparse with --cutoff, climatology with "
+        "--climatology and dense otherwise.",
+    )
+    parser.add_argument(
+        "--chunk-rows",
+        type=int,
+        default=10000,
+        help="CSV rows read and computed at a time.",
+    )
+    parser.add_argument("--workers", type=int, help="Number of workers.")
+    parser.add_argument("--executor", choices=("process", "thread"))
+    parser.add_argument("--cutoff", type=float, help="Cutoff of sparse footprints.")
+    parser.add_argument(
+        "--climatology",
+        choices=("all", "year", "month", "hour", "stability"),
+        help="Grouping of the climatology.",
+    )
+    parser.add_argument("-q", "--quiet", action="store_true")
+    args = parser.parse_args(argv)
+    logging.basicConfig(
+        level=logging.WARNING if args.quiet else logging.INFO, format="%(message)s"
+    )
+    with open(args.config) as f:
+        config = json.load(f)
+    options = {
+        name: getattr(args, name)
+        for name in ("workers", "executor", "cutoff", "climatology")
+        if getattr(args, name) is not None
+    }
+    try:
+        process(
+            config,
+            args.inputs,
+            output=args.output,
+            kind=args.kind,
+            chunk_rows=args.chunk_rows,
+            **options,
+        )
+    except (ValueError, FileExistsError) as err:
+        parser.exit(1, f"eddy-footprint: error: {err}\n")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,156 @@
+import numpy as np
+import xarray as xr
+
+CLIMATOLOGY_GROUPS = ("all", "year", "month", "hour", "stability")
+
+
+def group_labels(ds, *, by: str, stability=None) -> np.ndarray:
+    """Label each timestep of ``ds`` with the climatology group it belongs to.
+
+    Stability classes are unstable below -0.02, stable above 0.02 and else
+    neutral on the ``stability`` parameter of each timestep, as from
+    :meth:`FootprintModel.stability`. For the Hsieh et al. (2000) model this is
+    its ``zu / L``, so that the classes are the regimes its footprints were
+    computed in.
+    """
+    if by == "all":
+        return np.full(ds.sizes["time"], "all")
+    if by in ("year", "month", "hour"):
+        try:
+            return getattr(ds.time.dt, by).data
+        except (AttributeError, TypeError) as err:
+            raise ValueError(
+                f"Grouping by {by} requires datetime-like time values."
+            ) from err
+    if by == "stability":
+        if stability is None:
+            raise ValueError("Grouping by stability requires its parameter.")
+        zeta = np.asarray(stability)
+        return np.where(
+            zeta < -0.02, "unstable", np.where(zeta > 0.02, "stable", "neutral")
+        )
+    raise ValueError(
+        f"Unknown climatology grouping {by!r}, expected one of {CLIMATOLOGY_GROUPS}."
+    )
+
+
+class FootprintClimatology:
+    """Running weighted sums of normalized footprints, one per group.
+
+    Footprints are folded in one at a time with :meth:`add`, so memory is
+    bounded by the number of groups times the template grid, regardless of
+    how many timesteps are accumulated.
+    """
+
+    def __init__(self, *, x, y, groups, dim: str = "group"):
+        self.x = x
+        self.y = y
+        self.groups = np.asarray(groups)
+        self.dim = dim
+        self._index = {group: i for i, group in enumerate(self.groups.tolist())}
+        self.weighted_sum = np.zeros((len(self.groups), len(x), len(y)))
+        self.weight = np.zeros(len(self.groups))
+        self.count = np.zeros(len(self.groups), dtype=int)
+
+    def add(self, footprint: np.ndarray, *, group, weight: float = 1.0) -> bool:
+        """Fold one (x, y) footprint into its group.
+
+        Footprints or weights that are not finite (e.g. from gap-filled
+        inputs) are skipped and ``False`` is returned.
+        """
+        if not np.isfinite(weight) or not np.all(np.isfinite(footprint)):
+            return False
+        i = self._index[group]
+        self.weighted_sum[i] += weight * footprint
+        self.weight[i] += weight
+        self.count[i] += 1
+        return True
+
+    def result(self) -> xr.DataArray:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            data = self.weighted_sum / self.weight[:, None, None]
+        da = xr.DataArray(data, dims=(self.dim, "x", "y"))
+        da = da.assign_coords({self.dim: self.groups})
+        da = da.assign_coords(x=self.x)
+        da = da.assign_coords(y=self.y)
+        da = da.assign_coords(count=((self.dim), self.count))
+        da = da.assign_coords(weight=((self.dim), self.weight))
+        return da
+
+
+def calc_climatology(model, *, by: str = "all", weights=None) -> xr.DataArray:
+    """Accumulate the footprints of ``model`` into a grouped climatology.
+
+    Parameters
+    ----------
+    model : FootprintModel
+        Footprint model whose footprints are computed and folded in one
+        timestep at a time.
+    by : ``all``, ``year``, ``month``, ``hour`` or ``stability``
+        How timesteps are grouped. ``all`` returns a single (x, y) footprint.
+    weights : np.ndarray, optional
+        Per-timestep weights, e.g. fluxes. Default: equal weights.
+
+    Returns
+    -------
+    da: xarray.DataArray
+        Weighted mean footprint per group, with the number of footprints
+        and total weight of each group as ``count`` and ``weight`` coordinates.
+    """
+    labels = group_labels(
+        model.ds, by=by, stability=model.stability() if by == "stability" else None
+    )
+    if weights is None:
+        weights = np.ones(len(labels))
+    weights = np.asarray(weights, dtype=float)
+    if weights.shape != labels.shape:
+        raise ValueError(
+            f"weights must have one value per timestep ({len(labels)}), "
+            f"got shape {weights.shape}."
+        )
+    climatology = FootprintClimatology(
+        x=model.template_x, y=model.template_y, groups=np.unique(labels), dim=by
+    )
+    for footprint, label, weight in zip(model.iter_footprints(), labels, weights):
+        climatology.add(footprint.isel(time=0).data, group=label, weight=weight)
+    da = climatology.result()
+    if by == "all":
+        da = da.isel({by: 0}).drop_vars(by)
+    return da
+
+
+def merge_climatologies(a: xr.DataArray, b: xr.DataArray) -> xr.DataArray:
+    """Combine two climatologies of the same grouping, e.g. of consecutive
+    chunks of a record, into the climatology of all their timesteps.
+
+    Groups are matched by label; the mean footprints of groups in both are
+    averaged with their ``weight`` and their ``count`` added.
+    """
+    dims = [dim for dim in a.dims if dim not in ("x", "y")]
+    if not dims:
+        # ``all`` climatologies have no group dimension
+        da = merge_climatologies(single_group(a), single_group(b))
+        return da.isel(all=0).drop_vars("all")
+    (dim,) = dims
+    groups = np.union1d(a[dim].data, b[dim].data)
+    climatology = FootprintClimatology(x=a.x.data, y=a.y.data, groups=groups, dim=dim)
+    for da in (a, b):
+        for group, data, weight, count in zip(
+            da[dim].data.tolist(), da.data, da["weight"].data, da["count"].data
+        ):
+            if count == 0:
+                continue
+            i = climatology._index[group]
+            climatology.weighted_sum[i] += weight * data
+            climatology.weight[i] += weight
+            climatology.count[i] += count
+    return climatology.result()
+
+
+def single_group(da: xr.DataArray) -> xr.DataArray:
+    """``all`` climatology with a group dimension ``all`` of length one."""
+    return da.expand_dims("all").assign_coords(
+        all=["all"],
+        count=("all", [da["count"].item()]),
+        weight=("all", [da["weight"].item()]),
+    )
@@ -1,8 +1,125 @@
 from typing import Literal
 import xarray as xr
 import numpy as np
-from eddy_footprint.models import HsiehFootprintModel, KormannMeixnerFootprintModel
-from typing import Optional
+from eddy_footprint.climatology import calc_climatology
+from eddy_footprint.models import MODELS, FootprintCache
+from eddy_footprint.parametric import ParametricFootprints
+from eddy_footprint.profiling import FootprintProfile
+from eddy_footprint.sparse import SparseFootprints
+from eddy_footprint.spatial import TargetGrid, project
+from eddy_footprint.statistics import calc_statistics
+from eddy_footprint.store import write_footprints
+from typing import Iterator, Mapping, Optional, Sequence, Union
+
+#: keyword arguments of :func:`calc_footprint` that hold measurements
+MEASUREMENTS = (
+    "air_pressure",
+    "air_temperature",
+    "friction_velocity",
+    "wind_speed",
+    "cross_wind_variance",
+    "wind_direction",
+    "monin_obukhov_length",
+    "time",
+)
+
+
+def build_dataset(
+    *,
+    air_pressure: np.ndarray,
+    air_temperature: np.ndarray,
+    friction_velocity: np.ndarray,
+    wind_speed: np.ndarray,
+    cross_wind_variance: np.ndarray,
+    wind_direction: np.ndarray,
+    monin_obukhov_length: np.ndarray,
+    time: np.ndarray,
+) -> xr.Dataset:
+    """Dataset of the measured inputs of :func:`calc_footprint` along time."""
+    ds = xr.Dataset()
+    ds["air_pressure"] = xr.DataArray(
+        data=air_pressure, dims=["time"], coords=dict(time=time)
+    )
+    ds["air_temperature"] = xr.DataArray(
+        data=air_temperature, dims=["time"], coords=dict(time=time)
+    )
+    ds["friction_velocity"] = xr.DataArray(
+        data=friction_velocity, dims=["time"], coords=dict(time=time)
+    )
+    ds["wind_speed"] = xr.DataArray(
+        data=wind_speed, dims=["time"], coords=dict(time=time)
+    )
+    ds["cross_wind_variance"] = xr.DataArray(
+        data=cross_wind_variance, dims=["time"], coords=dict(time=time)
+    )
+    ds["wind_direction"] = xr.DataArray(
+        data=wind_direction, dims=["time"], coords=dict(time=time)
+    )
+    ds["monin_obukhov_length"] = xr.DataArray(
+        data=monin_obukhov_length, dims=["time"], coords=dict(time=time)
+    )
+    return ds
+
+
+def calc_monin_obukhov_length(
+    *,
+    air_pressure: np.ndarray,
+    air_temperature: np.ndarray,
+    friction_velocity: np.ndarray,
+    sensible_heat_flux: np.ndarray,
+) -> np.ndarray:
+    """Monin-Obukhov length in meters from air pressure (Pa), air temperature
+    (K), friction velocity (m/s) and sensible heat flux H (W/m^2), using the
+    density of dry air. Negative (unstable) for upward heat fluxes."""
+    cp = 1003
+    density = air_pressure / (287 * air_temperature)
+    return -(density * cp * friction_velocity**3 * air_temperature) / (
+        0.41 * 9.8 * sensible_heat_flux
+    )
+
+
+def model_class(method: str):
+    """Footprint model class of ``method``."""
+    if method not in MODELS:
+        raise ValueError(f"Unknown method {method!r}, expected one of {list(MODELS)}.")
+    return MODELS[method]
+
+
+def build_model(ds: xr.Dataset, *, method: str, **kwargs):
+    """Footprint model of ``method`` for the measurements in ``ds``."""
+    return model_class(method)(ds, **kwargs)
+
+
+#: options of calc_footprint that only apply to one output mode
+MODE_OPTIONS = {
+    "pyramid": "target",
+    "weights": "climatology",
+    "members": "ensemble",
+    "seed": "ensemble",
+    "sparse_format": "cutoff",
+}
+
+
+def check_output_options(*, parametric, statistics, ensemble, **options):
+    """Raise a ValueError if more than one output mode of :func:`calc_footprint`
+    is given, or an option of a mode that is not."""
+    modes = {
+        "parametric": bool(parametric),
+        "ensemble": ensemble is not None,
+        # statistics of ensemble members are part of the ensemble mode
+        "statistics": statistics is not None and ensemble is None,
+    }
+    for name in ("target", "climatology", "cutoff", "store"):
+        modes[name] = options[name] is not None
+    given = [name for name, on in modes.items() if on]
+    if len(given) > 1:
+        raise ValueError(f"Only one output mode can be given, got {given}.")
+    for name, mode in MODE_OPTIONS.items():
+        value = options[name]
+        # pyramid defaults to no levels rather than None
+        used = len(value) > 0 if name == "pyramid" else value is not None
+        if used and not modes[mode]:
+            raise ValueError(f"{name} requires {mode}.")
 
 
 def calc_footprint(
@@ -21,7 +138,30 @@ def calc_footprint(
     resolution: Optional[int] = 5,
     workers: Optional[int] = 1,
     method: Optional[Literal["Hsieh", "Kormann & Meixner"]] = "Hsieh",
-) -> xr.DataArray:
+    resampling: Optional[Literal["idw", "bilinear", "nearest"]] = "idw",
+    engine: Optional[Literal["xarray", "numpy"]] = "xarray",
+    block_size: Optional[int] = 16,
+    executor: Optional[Literal["process", "thread"]] = None,
+    chunk_size: Optional[int] = 64,
+    cache: Optional[FootprintCache] = None,
+    dtype: Optional[Literal["float32", "float64"]] = "float64",
+    separable: Optional[bool] = False,
+    direction_step: Optional[float] = None,
+    spacing: Optional[Union[Literal["uniform", "log"], np.ndarray]] = "uniform",
+    climatology: Optional[Literal["all", "year", "month", "hour", "stability"]] = None,
+    weights: Optional[np.ndarray] = None,
+    parametric: Optional[bool] = False,
+    cutoff: Optional[float] = None,
+    sparse_format: Optional[Literal["coo", "bbox"]] = None,
+    store=None,
+    statistics: Optional[Sequence[float]] = None,
+    profile: Optional[FootprintProfile] = None,
+    target: Optional[TargetGrid] = None,
+    pyramid: Optional[Sequence[int]] = (),
+    ensemble: Optional[Mapping] = None,
+    members: Optional[int] = None,
+    seed=None,
+) -> Union[xr.Dataset, xr.DataArray, ParametricFootprints, SparseFootprints]:
     """Create a dataset with footprint influences from eddy covariance measurements.
 
     .. warning::
@@ -61,58 +201,333 @@ def calc_footprint(
         Integer for the resolution in meters used in the footprint calculations
         and x and y dimensions. Default: 5.
     workers : int, optional
-        Number of workers to use for parallel processing during interpolation step.
+        Number of workers to use for parallel processing during interpolation step,
+        or the size of the worker pool if ``executor`` is given.
         If -1 is given all CPU threads are used. Default: 1.
     method : ``Hsieh`` or ``Kormann & Meixner``, optional
         The footprint model method to use, either Hsieh or Kormann & Meixner.
         Default: Hsieh.
-
+    resampling : ``idw``, ``bilinear`` or ``nearest``, optional
+        How the rotated model grid is resampled onto the output grid. ``idw``
+        builds a KDTree over the rotated model grid for every timestep and takes
+        the inverse-distance weighted mean of the 4 nearest points. ``bilinear``
+        and ``nearest`` instead rotate the output points back into the model
+        frame and interpolate on the regular model grid, which needs no tree and
+        is about ten times faster. Unlike ``idw``, they leave output points beyond
+        the model domain at zero instead of extrapolating the domain edge into
+        them. Default: idw.
+    engine : ``xarray`` or ``numpy``, optional
+        ``xarray`` computes footprints one timestep at a time with xarray objects.
+        ``numpy`` computes the model, rotation, resampling and normalization for
+        blocks of ``block_size`` timesteps at once on plain arrays and wraps the
+        result in xarray only at the end, which avoids per-timestep overhead.
+        Default: xarray.
+    block_size : int, optional
+        Number of timesteps computed together by the ``numpy`` engine. Memory use
+        grows with the block size. Default: 16.
+    executor : ``process`` or ``thread``, optional
+        Compute footprints in parallel by splitting the time axis into chunks of
+        ``chunk_size`` timesteps and running them on a pool of ``workers``
+        processes or threads. Every chunk runs the serial code path and chunks are
+        reassembled in time order, so the output is identical to the serial one.
+        Default: None (serial).
+    chunk_size : int, optional
+        Number of timesteps per parallel task. Default: 64.
+    cache : FootprintCache, optional
+        Cache that serves footprints of timesteps with nearly identical inputs
+        (up to the cache's quantization tolerance) from memory instead of
+        recomputing them. Pass the same cache to several calls to reuse it across
+        them. Default: None.
+    dtype : ``float32`` or ``float64``, optional
+        Floating point type in which footprints are computed and returned.
+        ``float32`` halves memory use. Default: float64.
+    separable : bool, optional
+        Exploit that Fx and the crosswind spread sigma_y only depend on the
+        along-wind distance: both are evaluated once per grid column and only the
+        crosswind Gaussian is evaluated per grid cell. Results agree with the
+        direct evaluation to rounding error. Default: False.
+    direction_step : float, optional
+        Quantize wind directions to bins of this width in degrees (e.g. 1) and
+        resample with one precomputed sparse matrix per bin. Rotation and
+        resampling only depend on wind direction and the grids, so each bin's
+        weights are computed once and every timestep in it costs one sparse
+        matrix product. Matrices take up to a few MB each (most with ``idw``)
+        and are kept up to 1 GiB. Default: None (exact wind directions).
+    spacing : ``uniform``, ``log`` or np.ndarray, optional
+        Along-wind axis of the model-frame grid on which footprints are
+        evaluated before resampling. ``uniform`` steps by ``resolution``.
+        ``log`` starts at a tenth of ``resolution`` near the tower, where Fx
+        changes fastest, and grows its steps in proportion to the distance up to
+        twice ``resolution``. With ``bilinear`` or ``nearest`` resampling this is
+        as accurate as ``uniform`` with fewer model-frame cells on large
+        domains. An increasing array of along-wind distances in meters is used
+        as given. Model-frame integrals (``statistics``, overlays) weight cells
+        by their area. Default: uniform.
+    climatology : ``all``, ``year``, ``month``, ``hour`` or ``stability``, optional
+        If given, return a footprint climatology instead of one footprint per
+        timestep. Each footprint is folded into a running weighted sum as soon
+        as it is computed, so memory stays bounded by the template grid no
+        matter how many timesteps there are. Timesteps are grouped by calendar
+        year, month or hour of day (requires datetime-like time), by stability
+        class of z/L (unstable < -0.02 <= neutral <= 0.02 < stable), or all
+        together. Timesteps with non-finite footprints are skipped.
+        Default: None.
+    weights : np.ndarray, optional
+        Array with per-timestep weights (e.g. fluxes) for the climatology.
+        Default: equal weights.
+    parametric : bool, optional
+        If True, return a :class:`ParametricFootprints` holding only the handful of
+        model parameters of each timestep instead of dense grids. Footprints are
+        rasterized from it on demand. Default: False.
+    cutoff : float, optional
+        If given, return a :class:`SparseFootprints` that keeps, for each timestep,
+        only the strongest cells that together cover this fraction (e.g. 0.9) of
+        its total influence. Footprints are truncated one at a time as they are
+        computed, so the dense (time, x, y) cube is never built. Default: None.
+    sparse_format : ``coo`` or ``bbox``, optional
+        With ``cutoff``, store the kept cells as a list of cells (``coo``) or as
+        the dense crop of their bounding box (``bbox``). Default: coo.
+    store : str or MutableMapping, optional
+        If given, write the footprints to this on-disk store instead of building
+        them in memory, and return the store opened lazily as a dataset with a
+        ``footprint`` variable. Footprints are computed and written one chunk of
+        ``chunk_size`` timesteps at a time (in parallel with ``executor``), so
+        memory stays bounded by one chunk. Paths ending in ``.nc`` or ``.nc4``
+        are written as compressed NetCDF4 (requires ``netCDF4``), anything else
+        as Zarr (requires ``zarr``). Each timestep is stored as one chunk of the
+        full (x, y) grid. The store must not exist yet. Default: None.
+    statistics : sequence of float, optional
+        If given, return per-timestep footprint statistics instead of
+        footprints: the peak distance, and the along-wind extent and source
+        area holding each of these fractions (e.g. ``(0.5, 0.7, 0.9)``) of the
+        footprint. They are computed in blocks of ``block_size`` timesteps on
+        the model-frame grid, which does not depend on wind direction, so
+        nothing is rotated or resampled. Default: None.
+    profile : FootprintProfile, optional
+        Profile in which the wall time, call count and bytes produced of each
+        stage of the computation (``calc_parameters``, ``build_grid``,
+        ``calc_Fxy`` and its terms, ``resample`` with its rotation and KDTree
+        build and query, ``fillna``, ``sum_one`` or ``normalize``, and
+        ``concat``) are recorded. Read it with
+        :meth:`FootprintProfile.to_dataset` after the call, and pass the same
+        profile to several calls to accumulate them. Default: None.
+    target : TargetGrid, optional
+        If given, return footprints on this georeferenced grid instead of the
+        tower-centred template grid: each cell holds the fraction of the
+        footprint that falls on it, projected from the model frame as in
+        :func:`~eddy_footprint.spatial.project_block` regardless of
+        ``resampling``. Footprints are projected in blocks of ``block_size`` timesteps.
+        Default: None.
+    pyramid : sequence of int, optional
+        With ``target``, also return the footprints summed over blocks of each
+        of these factors (e.g. ``(2, 4, 8)``) of target cells, computed block by
+        block in the same pass. Default: () (no pyramid levels).
+    ensemble : mapping, optional
+        If given, return a Monte Carlo ensemble of each timestep instead of its
+        footprint. Keys are the measured inputs to perturb
+        (``friction_velocity``, ``cross_wind_variance``,
+        ``monin_obukhov_length``, ``wind_direction`` and for Kormann & Meixner
+        ``wind_speed``). Values are arrays of member values with shape
+        (time, member) or (member,), distributions with an ``rvs`` method (e.g.
+        ``scipy.stats.norm(scale=0.05)``) whose samples are added to the
+        measurements, or standard deviations of Gaussian noise added to them.
+        All members of all timesteps are computed in blocks of ``block_size``
+        on one shared grid and resampling setup, and only their mean and spread
+        are kept. With ``statistics``, the statistics of every member are
+        returned instead. Default: None.
+    members : int, optional
+        Number of ensemble members per timestep. Default: the length of the
+        member arrays in ``ensemble``.
+    seed : int or numpy.random.Generator, optional
+        Seed of the ensemble perturbations. Default: None.
 
     Returns
     -------
     da: xarray.DataArray
-        DataArray with footprints of influence.
+        DataArray with footprints of influence, and a ``status`` coordinate along
+        time that is ``ok`` for computed timesteps or else names why the timestep
+        was skipped (``missing`` inputs, the out-of-range input, or non-finite
+        ``parameters``). Inputs are checked up front and skipped timesteps are
+        never computed; their footprints are NaN. With ``climatology``, the weighted
+        mean footprint of each group along a dimension named after the grouping,
+        with ``count`` and ``weight`` coordinates. With ``parametric``, a
+        :class:`ParametricFootprints`, and with ``cutoff``, a
+        :class:`SparseFootprints`. With ``store``, the written store as a lazily
+        opened xarray.Dataset. With ``statistics``, an xarray.Dataset with one
+        variable per metric along time. With ``target``, a (time, y, x)
+        DataArray on the target grid with the northing of its rows and the
+        easting of its columns as coordinates, and with ``pyramid``, an
+        xarray.Dataset holding it as ``footprint`` and each level as
+        ``footprint_<factor>`` on dims ``y_<factor>`` and ``x_<factor>``. With
+        ``ensemble``, an xarray.Dataset with the ``mean`` and standard
+        deviation ``std`` of the member footprints of each timestep and their
+        number of valid ``members``, or with ``statistics`` each statistic
+        along (time, member).
     """
-    ds = xr.Dataset()
-    ds["air_pressure"] = xr.DataArray(
-        data=air_pressure, dims=["time"], coords=dict(time=time)
+    check_output_options(
+        parametric=parametric,
+        ensemble=ensemble,
+        statistics=statistics,
+        target=target,
+        climatology=climatology,
+        cutoff=cutoff,
+        store=store,
+        pyramid=pyramid,
+        weights=weights,
+        members=members,
+        seed=seed,
+        sparse_format=sparse_format,
     )
-    ds["air_temperature"] = xr.DataArray(
-        data=air_temperature, dims=["time"], coords=dict(time=time)
+    ds = build_dataset(
+        air_pressure=air_pressure,
+        air_temperature=air_temperature,
+        friction_velocity=friction_velocity,
+        wind_speed=wind_speed,
+        cross_wind_variance=cross_wind_variance,
+        wind_direction=wind_direction,
+        monin_obukhov_length=monin_obukhov_length,
+        time=time,
     )
-    ds["friction_velocity"] = xr.DataArray(
-        data=friction_velocity, dims=["time"], coords=dict(time=time)
-    )
-    ds["wind_speed"] = xr.DataArray(
-        data=wind_speed, dims=["time"], coords=dict(time=time)
-    )
-    ds["cross_wind_variance"] = xr.DataArray(
-        data=cross_wind_variance, dims=["time"], coords=dict(time=time)
-    )
-    ds["wind_direction"] = xr.DataArray(
-        data=wind_direction, dims=["time"], coords=dict(time=time)
-    )
-    ds["monin_obukhov_length"] = xr.DataArray(
-        data=monin_obukhov_length, dims=["time"], coords=dict(time=time)
+
+    model = build_model(
+        ds,
+        method=method,
+        instrument_height=instrument_height,
+        roughness_length=roughness_length,
+        domain_length=domain_length,
+        resolution=resolution,
+        workers=workers,
+        resampling=resampling,
+        engine=engine,
+        block_size=block_size,
+        executor=executor,
+        chunk_size=chunk_size,
+        cache=cache,
+        dtype=dtype,
+        separable=separable,
+        direction_step=direction_step,
+        spacing=spacing,
+        profile=profile,
     )
 
-    if method == "Hsieh":
-        model = HsiehFootprintModel(
-            ds,
-            instrument_height=instrument_height,
-            roughness_length=roughness_length,
-            domain_length=domain_length,
-            resolution=resolution,
-            workers=workers,
+    if parametric:
+        return ParametricFootprints.from_model(model, method=method)
+    if ensemble is not None:
+        return model.calc_ensemble(
+            ensemble, members=members, seed=seed, levels=statistics
         )
-    elif method == "Kormann & Meixner":
-        model = KormannMeixnerFootprintModel(
-            ds,
-            instrument_height=instrument_height,
-            roughness_length=roughness_length,
-            domain_length=domain_length,
-            resolution=resolution,
-            workers=workers,
+    if statistics is not None:
+        return calc_statistics(model, levels=statistics)
+    if target is not None:
+        return project(model, target, pyramid=pyramid, block_size=block_size)
+    if climatology is not None:
+        return calc_climatology(model, by=climatology, weights=weights)
+    if cutoff is not None:
+        sparse = SparseFootprints.from_footprints(
+            model.iter_footprints(), cutoff=cutoff, format=sparse_format or "coo"
         )
-
+        sparse.ds = sparse.ds.assign_coords(status=model.ds["status"])
+        return sparse
+    if store is not None:
+        return write_footprints(model, store)
     return model.footprints
+
+
+def iter_footprints(
+    *,
+    air_pressure: np.ndarray,
+    air_temperature: np.ndarray,
+    friction_velocity: np.ndarray,
+    wind_speed: np.ndarray,
+    cross_wind_variance: np.ndarray,
+    wind_direction: np.ndarray,
+    monin_obukhov_length: np.ndarray,
+    time: np.ndarray,
+    instrument_height: float,
+    roughness_length: float,
+    chunk_size: Optional[int] = None,
+    domain_length: Optional[int] = 1000,
+    resolution: Optional[int] = 5,
+    workers: Optional[int] = 1,
+    method: Optional[Literal["Hsieh", "Kormann & Meixner"]] = "Hsieh",
+    resampling: Optional[Literal["idw", "bilinear", "nearest"]] = "idw",
+    engine: Optional[Literal["xarray", "numpy"]] = "xarray",
+    block_size: Optional[int] = 16,
+    executor: Optional[Literal["process", "thread"]] = None,
+    cache: Optional[FootprintCache] = None,
+    dtype: Optional[Literal["float32", "float64"]] = "float64",
+    separable: Optional[bool] = False,
+    direction_step: Optional[float] = None,
+    spacing: Optional[Union[Literal["uniform", "log"], np.ndarray]] = "uniform",
+    profile: Optional[FootprintProfile] = None,
+) -> Iterator[xr.DataArray]:
+    """Iterate over the footprints of :func:`calc_footprint` one timestep or one
+    chunk of timesteps at a time, in time order.
+
+    Footprints are computed as they are requested, so the first one is
+    available after computing a single timestep (or one ``block_size`` block
+    with the ``numpy`` engine), and memory is bounded by the footprints being
+    computed rather than by the length of the record. With an ``executor``,
+    chunks are computed ahead on the pool, at most two per worker.
+
+    Parameters
+    ----------
+    chunk_size : int, optional
+        Number of timesteps per yielded footprint array. Default: None, which
+        yields one timestep at a time, computed in chunks of 64 timesteps with
+        an ``executor``.
+    **kwargs
+        The measurements, site constants and computation options of
+        :func:`calc_footprint`, with the same defaults.
+
+    Yields
+    ------
+    da: xarray.DataArray
+        Without ``chunk_size``, the (x, y) footprint of one timestep with scalar
+        ``time`` and ``status`` coordinates. With ``chunk_size``, (time, x, y)
+        footprints of up to ``chunk_size`` timesteps as returned by
+        :func:`calc_footprint`. Skipped timesteps are NaN, as there.
+    """
+    if chunk_size is not None and chunk_size < 1:
+        raise ValueError(f"chunk_size must be a positive integer, got {chunk_size}.")
+    ds = build_dataset(
+        air_pressure=air_pressure,
+        air_temperature=air_temperature,
+        friction_velocity=friction_velocity,
+        wind_speed=wind_speed,
+        cross_wind_variance=cross_wind_variance,
+        wind_direction=wind_direction,
+        monin_obukhov_length=monin_obukhov_length,
+        time=time,
+    )
+    # the model is built, and its inputs checked, before the first footprint
+    # is requested
+    model = build_model(
+        ds,
+        method=method,
+        instrument_height=instrument_height,
+        roughness_length=roughness_length,
+        domain_length=domain_length,
+        resolution=resolution,
+        workers=workers,
+        resampling=resampling,
+        engine=engine,
+        block_size=block_size,
+        executor=executor,
+        chunk_size=64 if chunk_size is None else chunk_size,
+        cache=cache,
+        dtype=dtype,
+        separable=separable,
+        direction_step=direction_step,
+        spacing=spacing,
+        profile=profile,
+    )
+    if chunk_size is not None:
+        return model.iter_chunks()
+    return _iter_timesteps(model)
+
+
+def _iter_timesteps(model):
+    status = model.ds["status"].data
+    for i, footprint in enumerate(model.iter_footprints()):
+        yield footprint.assign_coords(status=("time", status[i : i + 1])).isel(time=0)
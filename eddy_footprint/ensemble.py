@@ -0,0 +1,167 @@
+import copy
+from typing import Mapping, Optional
+
+import numpy as np
+import xarray as xr
+from eddy_footprint.statistics import model_statistics, units
+
+
+def member_inputs(
+    model, perturbations: Mapping, *, members: Optional[int] = None, rng=None
+) -> dict:
+    """Inputs of every ensemble member as (time, member) arrays, keyed by the
+    names of the model's measured inputs.
+
+    Each entry of ``perturbations`` is either an array of member values with
+    shape (time, member) or (member,), a distribution with an ``rvs`` method
+    (e.g. a frozen :mod:`scipy.stats` distribution) whose samples are added to
+    the measured values, or a number, the standard deviation of Gaussian noise
+    added to them. Inputs without an entry keep their measured value.
+    """
+    unknown = set(perturbations) - set(model.inputs)
+    if unknown:
+        raise ValueError(
+            f"Cannot perturb {sorted(unknown)}, the inputs of "
+            f"{type(model).__name__} are {list(model.inputs)}."
+        )
+    sizes = {np.shape(spec)[-1] for spec in perturbations.values() if np.ndim(spec)}
+    if members is None:
+        if len(sizes) != 1:
+            raise ValueError("members is required without member arrays.")
+        (members,) = sizes
+    elif sizes - {members}:
+        raise ValueError(f"Member arrays do not have {members} members.")
+    rng = np.random.default_rng(rng)
+    shape = (model.ds.sizes["time"], members)
+    values = {}
+    for name in model.inputs:
+        if name not in model.ds.variables:
+            continue
+        measured = np.broadcast_to(model.ds[name].data[:, np.newaxis], shape)
+        spec = perturbations.get(name)
+        if spec is None:
+            values[name] = measured
+        elif np.ndim(spec):
+            values[name] = np.broadcast_to(np.asarray(spec, dtype=np.float64), shape)
+        elif hasattr(spec, "rvs"):
+            values[name] = measured + spec.rvs(size=shape, random_state=rng)
+        else:
+            values[name] = measured + rng.normal(0, float(spec), shape)
+    if "wind_direction" in perturbations:
+        values["wind_direction"] = np.mod(values["wind_direction"], 360)
+    return values
+
+
+def member_model(model, values: dict):
+    """Copy of ``model`` whose timesteps are the members of each of its
+    timesteps, in time-major order, with parameters derived from the member
+    inputs. The copy shares the model's grid and resampling setup."""
+    ntime, members = next(iter(values.values())).shape
+    ds = model.ds.drop_vars("status").isel(time=np.repeat(np.arange(ntime), members))
+    ds = ds.assign_coords(time=np.arange(ntime * members))
+    for name, value in values.items():
+        ds[name] = ("time", np.ascontiguousarray(value).ravel())
+    ensemble = copy.copy(model)
+    ensemble.__dict__.pop("footprints", None)
+    ensemble.ds = ds
+    ensemble.calc_parameters()
+    ensemble.classify()
+    return ensemble
+
+
+def calc_ensemble(
+    model,
+    perturbations: Mapping,
+    *,
+    members: Optional[int] = None,
+    seed=None,
+    levels=None,
+) -> xr.Dataset:
+    """Monte Carlo ensemble of the footprints of every timestep of ``model``.
+
+    All members of all timesteps are computed as one batch of timesteps, in
+    blocks of the model's ``block_size``, on the model's grid and resampling
+    setup. Members whose perturbed inputs are invalid (e.g. a negative
+    friction velocity) are skipped, as invalid timesteps are.
+
+    Parameters
+    ----------
+    model : FootprintModel
+        Footprint model whose timesteps are perturbed.
+    perturbations : mapping
+        Perturbation of each measured input to vary, keyed by input name, as
+        described in :func:`member_inputs`.
+    members : int, optional
+        Number of members per timestep. Default: the length of the member
+        arrays in ``perturbations``.
+    seed : optional
+        Seed or :class:`numpy.random.Generator` with which perturbations are
+        sampled. Default: None (unpredictable).
+    levels : sequence of float, optional
+        If given, return footprint statistics (as in :func:`calc_statistics`,
+        with these levels) of every member instead of maps. These are computed
+        on the model-frame grid without rotating or resampling. Default: None.
+
+    Returns
+    -------
+    ds: xarray.Dataset
+        Without ``levels``, the ``mean`` and standard deviation ``std`` of the
+        normalized member footprints of each timestep on the template grid,
+        with the number of valid ``members`` of each timestep. With ``levels``,
+        one variable per statistic along (time, member), with the ``status`` of
+        every member.
+    """
+    values = member_inputs(model, perturbations, members=members, rng=seed)
+    ntime, members = next(iter(values.values())).shape
+    ensemble = member_model(model, values)
+    if levels is not None:
+        ds = calc_member_statistics(ensemble, ntime=ntime, levels=levels)
+        ds = ds.assign_coords(
+            status=(("time", "member"), ensemble.ds["status"].data.reshape(ntime, -1))
+        )
+    else:
+        valid = np.flatnonzero(ensemble.ds["status"].data == "ok")
+        ds = calc_member_maps(ensemble, valid, ntime=ntime, members=members)
+        ds = ds.assign_coords(status=("time", model.ds["status"].data))
+    return ds.assign_coords(time=model.ds.time.data)
+
+
+def calc_member_maps(ensemble, valid, *, ntime: int, members: int) -> xr.Dataset:
+    """Mean and standard deviation of the member footprints of each timestep,
+    accumulated block by block."""
+    shape = ensemble.template_xx.shape
+    total = np.zeros((ntime,) + shape)
+    squares = np.zeros((ntime,) + shape)
+    count = np.zeros(ntime, dtype=np.int64)
+    for start in range(0, len(valid), ensemble.block_size):
+        rows = valid[start : start + ensemble.block_size]
+        footprints = ensemble.calc_footprint_block(ensemble.ds.isel(time=rows))
+        owners = rows // members
+        # members are in time-major order, so each timestep is one run of rows
+        for owner in np.unique(owners):
+            block = footprints[owners == owner]
+            total[owner] += block.sum(axis=0)
+            squares[owner] += (block.astype(np.float64) ** 2).sum(axis=0)
+            count[owner] += len(block)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = total / count[:, np.newaxis, np.newaxis]
+        variance = squares / count[:, np.newaxis, np.newaxis] - mean**2
+    ds = xr.Dataset(
+        coords=dict(x=ensemble.template_x, y=ensemble.template_y),
+    )
+    ds["mean"] = (("time", "x", "y"), mean.astype(ensemble.dtype))
+    ds["std"] = (
+        ("time", "x", "y"),
+        np.sqrt(np.maximum(variance, 0)).astype(ensemble.dtype),
+    )
+    ds["members"] = ("time", count)
+    return ds
+
+
+def calc_member_statistics(ensemble, *, ntime: int, levels) -> xr.Dataset:
+    """Footprint statistics of every member on the model-frame grid."""
+    ds = xr.Dataset()
+    for name, value in model_statistics(ensemble, levels=levels).items():
+        ds[name] = (("time", "member"), value.reshape(ntime, -1))
+        ds[name].attrs["units"] = units(name)
+    return ds
@@ -1,17 +1,166 @@
+import math
+import threading
 from abc import ABC, abstractmethod
+from collections import OrderedDict
+from functools import cached_property
+from typing import Optional
 
 import xarray as xr
 import numpy as np
-from scipy.special import gamma
+from eddy_footprint.ensemble import calc_ensemble
+from eddy_footprint.parallel import map_chunks
+from eddy_footprint.profiling import FootprintProfile, stage
 from eddy_footprint.spatial import (
-    build_domain,
-    build_template,
+    FootprintGrid,
     normalize_domain,
+    resample_block,
     sum_one,
 )
 
 
+class FootprintCache:
+    """Least-recently-used cache of footprints keyed on quantized inputs.
+
+    Timesteps whose model parameters agree to within ``rtol`` (relative) and whose
+    wind directions fall in the same ``direction_step`` bin share one entry. Two
+    kinds of entries are kept: the model-frame grid, which does not depend on wind
+    direction, and the rotated, resampled and normalized footprint. Footprints are
+    computed from the quantized inputs, so results do not depend on the order in
+    which timesteps are processed. Timesteps with non-finite inputs bypass the cache.
+
+    A cache can be shared between calls to :func:`calc_footprint` and models with
+    different sites or grids. With a process executor each worker process fills
+    its own copy, and only thread executors share the cache and its statistics.
+
+    Parameters
+    ----------
+    max_bytes : int, optional
+        Memory budget of the cached arrays in bytes. Least recently used entries
+        are evicted beyond it. Default: 1 GiB.
+    rtol : float, optional
+        Relative tolerance to which model parameters are quantized. Default: 1e-3.
+    direction_step : float, optional
+        Width in degrees of the wind direction bins. Default: 1.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_bytes: int = 2**30,
+        rtol: float = 1e-3,
+        direction_step: float = 1.0,
+    ):
+        self.max_bytes = max_bytes
+        self.rtol = rtol
+        self.direction_step = direction_step
+        self.nbytes = 0
+        self.hits = {"frame": 0, "footprint": 0}
+        self.misses = {"frame": 0, "footprint": 0}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def quantize(self, values: dict, *, context: tuple):
+        """Keys of the model-frame grid and of the footprint for ``values``, and
+        the quantized values they are computed from. Keys are None if any value
+        is not finite."""
+        key = []
+        quantized = {}
+        for name, value in values.items():
+            if not math.isfinite(value):
+                return None, None, values
+            if name == "wind_direction":
+                direction = round((value % 360) / self.direction_step)
+                quantized[name] = direction * self.direction_step
+            elif value == 0:
+                key.append((name, 0.0, 0))
+                quantized[name] = 0.0
+            else:
+                index = round(math.log(abs(value)) / math.log1p(self.rtol))
+                sign = math.copysign(1.0, value)
+                key.append((name, sign, index))
+                quantized[name] = sign * (1 + self.rtol) ** index
+        frame_key = ("frame", context, tuple(key))
+        return frame_key, ("footprint",) + frame_key[1:] + (direction,), quantized
+
+    def get(self, key):
+        if key is None:
+            return None
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses[key[0]] += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits[key[0]] += 1
+            return value
+
+    def put(self, key, value: np.ndarray):
+        if key is None or value.nbytes > self.max_bytes:
+            return
+        value.flags.writeable = False
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = value
+            self.nbytes += value.nbytes
+            while self.nbytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def stats(self) -> dict:
+        """Hits, misses and hit rate of each kind of entry, with the number of
+        entries and bytes currently cached."""
+        stats = {"entries": len(self), "nbytes": self.nbytes}
+        for level in ("frame", "footprint"):
+            lookups = self.hits[level] + self.misses[level]
+            stats[level] = dict(
+                hits=self.hits[level],
+                misses=self.misses[level],
+                hit_rate=self.hits[level] / lookups if lookups else 0.0,
+            )
+        return stats
+
+
+#: engines that evaluate and resample the footprints of the timesteps
+ENGINES = ("xarray", "numpy")
+
+#: smallest magnitude of the Monin-Obukhov length in meters that is modelled
+MIN_OBUKHOV_LENGTH = 1e-3
+
+#: checks of the measured inputs in the order they are applied, as the status
+#: a timestep gets when it fails them and the condition its input must meet
+INPUT_CHECKS = (
+    ("friction_velocity", lambda value: value > 0),
+    ("wind_speed", lambda value: value > 0),
+    ("cross_wind_variance", lambda value: value > 0),
+    ("monin_obukhov_length", lambda value: np.abs(value) >= MIN_OBUKHOV_LENGTH),
+    ("wind_direction", lambda value: (value >= 0) & (value <= 360)),
+)
+
+
 class FootprintModel(ABC):
+    #: variables of ``ds`` that define the footprint of a timestep
+    parameters = ()
+    #: measured variables of ``ds`` the parameters are derived from
+    inputs = ()
+
     @abstractmethod
     def __init__(
         self,
@@ -22,55 +171,393 @@ class FootprintModel(ABC):
         domain_length: int,
         resolution: int,
         workers: int,
+        resampling: str = "idw",
+        engine: str = "xarray",
+        block_size: int = 16,
+        executor: Optional[str] = None,
+        chunk_size: int = 64,
+        cache: Optional[FootprintCache] = None,
+        dtype=np.float64,
+        separable: bool = False,
+        direction_step: Optional[float] = None,
+        spacing="uniform",
+        grid: Optional[FootprintGrid] = None,
+        profile: Optional[FootprintProfile] = None,
     ):
         self.ds = ds
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine {engine!r}, expected one of {ENGINES}.")
         self.instrument_height = instrument_height
         self.roughness_length = roughness_length
-        self.domain = build_domain(
-            domain_length=domain_length, resolution=resolution, time=self.ds.time.data
-        )
-        self.calc_parameters()
-        self.calc_Fx()
-        self.calc_Dxy()
-        self.calc_Fxy()
-        query_points, template_xx, _, template_x, template_y = build_template(
+        # with an executor the workers run whole chunks and each KDTree query
+        # stays single-threaded
+        self.executor = executor
+        self.max_workers = workers
+        self.chunk_size = chunk_size
+        self.workers = workers if executor is None else 1
+        self.resampling = resampling
+        self.engine = engine
+        self.block_size = block_size
+        self.cache = cache
+        self.dtype = np.dtype(dtype)
+        self.separable = separable
+        self.profile = profile
+        # parameters are only derived when they are not given, e.g. when
+        # rasterizing a ParametricFootprints dataset
+        if not all(name in ds.variables for name in self.parameters):
+            with self.stage("calc_parameters"):
+                self.calc_parameters()
+        self.classify()
+        settings = dict(
             domain_length=domain_length,
             resolution=resolution,
+            dtype=self.dtype,
+            resampling=resampling,
+            direction_step=direction_step,
+            spacing=spacing,
+        )
+        if grid is None:
+            with self.stage("build_grid"):
+                grid = FootprintGrid(**settings, workers=self.workers)
+        elif grid.key != FootprintGrid.settings_key(**settings):
+            raise ValueError("The grid does not match the model's grid settings.")
+        self.grid = grid
+        self.direction_step = direction_step
+        self.domain = grid.domain
+        self.query_points = grid.query_points
+        self.template_xx = grid.template_xx
+        self.template_x = grid.template_x
+        self.template_y = grid.template_y
+        self.resampling_table = grid.resampling_table
+
+    @cached_property
+    def footprints(self):
+        if self.executor is not None:
+            chunks = list(self.iter_chunks())
+            with self.stage("concat") as record:
+                return record.add(xr.concat(chunks, dim="time"))
+        return self.calc_footprints(self.ds)
+
+    def calc_ensemble(self, perturbations, *, members=None, seed=None, levels=None):
+        """Monte Carlo ensemble of every timestep with perturbed inputs, as mean
+        and spread maps or per-member statistics; see
+        :func:`eddy_footprint.ensemble.calc_ensemble`."""
+        return calc_ensemble(
+            self, perturbations, members=members, seed=seed, levels=levels
+        )
+
+    def stage(self, name: str):
+        """Context that records a stage in :attr:`profile`, if profiling."""
+        return stage(self.profile, name)
+
+    def calc_footprints(self, ds):
+        """Normalized footprints for all timesteps of ``ds`` as one DataArray."""
+        if self.engine == "numpy":
+            data = np.empty(
+                (ds.sizes["time"],) + self.template_xx.shape, dtype=self.dtype
+            )
+            start = 0
+            for times, block in self.iter_blocks(ds):
+                data[start : start + len(times)] = block
+                start += len(times)
+            da = self.wrap_footprints(data, ds.time.data)
+        else:
+            footprints = list(self.iter_footprints(ds))
+            with self.stage("concat") as record:
+                da = record.add(xr.concat(footprints, dim="time"))
+        return da.assign_coords(status=("time", ds["status"].data))
+
+    def iter_footprints(self, ds=None):
+        """Yield the normalized footprint of each timestep in time order.
+
+        Only one timestep (or one block with the numpy engine, or a few chunks
+        with an executor) is held in memory at a time, so consumers that reduce
+        the footprints as they go (e.g. climatologies) never build the full
+        (time, x, y) cube.
+        """
+        if ds is None and self.executor is not None:
+            for chunk in self.iter_chunks():
+                for i in range(chunk.sizes["time"]):
+                    yield chunk.isel(time=[i])
+            return
+        ds = self.ds if ds is None else ds
+        if self.engine == "numpy":
+            for times, block in self.iter_blocks(ds):
+                for i in range(len(times)):
+                    yield self.wrap_footprints(block[i : i + 1], times[i : i + 1])
+        else:
+            for timestep in ds.time:
+                yield self.calc_footprint(timestep)
+
+    def iter_blocks(self, ds=None):
+        """Yield the time values and normalized footprints of each block of
+        ``block_size`` timesteps as plain (time, x, y) arrays."""
+        ds = self.ds if ds is None else ds
+        for start in range(0, ds.sizes["time"], self.block_size):
+            block = ds.isel(time=slice(start, start + self.block_size))
+            yield block.time.data, self.calc_footprint_block(block)
+
+    def iter_chunks(self):
+        """Yield the footprints of each chunk of ``chunk_size`` timesteps in time
+        order, computed in parallel on the model's executor if it has one."""
+        if self.executor is None:
+            for start in range(0, self.ds.sizes["time"], self.chunk_size):
+                yield self.calc_footprints(
+                    self.ds.isel(time=slice(start, start + self.chunk_size))
+                )
+            return
+        yield from map_chunks(
+            self,
+            executor=self.executor,
+            workers=self.max_workers,
+            chunk_size=self.chunk_size,
+        )
+
+    def classify(self):
+        """Label each timestep with ``ok`` or the reason it is skipped as the
+        ``status`` coordinate of :attr:`ds`.
+
+        Timesteps are ``missing`` if any of the model's measured inputs is NaN,
+        are labelled with the name of the first input that is out of range
+        (``friction_velocity``, ``wind_speed`` or ``cross_wind_variance`` not
+        positive, ``monin_obukhov_length`` within
+        ``MIN_OBUKHOV_LENGTH`` of zero or ``wind_direction`` outside [0, 360]),
+        and ``parameters`` if the derived parameters are not finite. Only the
+        inputs present in :attr:`ds` are checked.
+        """
+        inputs = [name for name in self.inputs if name in self.ds.variables]
+        missing = np.zeros(self.ds.sizes["time"], dtype=bool)
+        for name in inputs:
+            missing |= np.isnan(self.ds[name].data)
+        conditions = [missing]
+        reasons = ["missing"]
+        with np.errstate(invalid="ignore"):
+            for name, check in INPUT_CHECKS:
+                if name in inputs:
+                    conditions.append(~check(self.ds[name].data))
+                    reasons.append(name)
+        # some parameters, e.g. zu, are scalars
+        shape = (self.ds.sizes["time"],)
+        conditions.append(
+            ~np.all(
+                [
+                    np.broadcast_to(np.isfinite(self.ds[name].data), shape)
+                    for name in self.parameters
+                ],
+                axis=0,
+            )
+        )
+        reasons.append("parameters")
+        status = np.select(conditions, reasons, default="ok")
+        self.ds = self.ds.assign_coords(status=("time", status))
+
+    def calc_footprint(self, timestep):
+        if self.ds["status"].sel(time=timestep).item() != "ok":
+            return self.wrap_footprints(
+                np.full((1,) + self.template_xx.shape, np.nan, dtype=self.dtype),
+                [timestep.values],
+            )
+        if self.cache is not None or self.resampling_table is not None:
+            time = [timestep.values]
+            block = self.calc_footprint_block(self.ds.sel(time=time))
+            return self.wrap_footprints(block, time)
+        timestep_params = self.ds.sel(time=timestep).astype(self.dtype)
+        Fxy = self.calc_Fxy(
+            timestep_params,
+            x=self.domain.x,
+            y=self.domain.y,
+            xx=self.domain.xx,
+            yy=self.domain.yy,
+        ).assign_coords(xx=self.domain.xx, yy=self.domain.yy)
+        with self.stage("resample") as record:
+            timestep_ds = record.add(
+                normalize_domain(
+                    Fxy,
+                    wind_direction=timestep_params["wind_direction"].data,
+                    query_points=self.query_points,
+                    template_xx=self.template_xx,
+                    template_x=self.template_x,
+                    template_y=self.template_y,
+                    workers=self.workers,
+                    resampling=self.resampling,
+                    profile=self.profile,
+                )
+            )
+        with self.stage("fillna") as record:
+            timestep_ds = record.add(timestep_ds.astype(self.dtype).fillna(0))
+        timestep_ds = timestep_ds.expand_dims(dim={"time": [timestep.values]})
+        with self.stage("sum_one") as record:
+            timestep_ds = record.add(sum_one(timestep_ds))
+        return timestep_ds
+
+    def calc_footprint_block(self, ds) -> np.ndarray:
+        """Normalized footprints for all timesteps of ``ds`` as one
+        (time, x, y) array, computed without intermediate xarray objects.
+        Timesteps whose status is not ``ok`` are not computed and are NaN."""
+        valid = ds["status"].data == "ok"
+        if not valid.all():
+            footprints = np.full(
+                (len(valid),) + self.template_xx.shape, np.nan, dtype=self.dtype
+            )
+            if valid.any():
+                footprints[valid] = self.calc_footprint_block(ds.isel(time=valid))
+            return footprints
+        if self.cache is not None:
+            return np.stack(
+                [
+                    self.calc_cached_footprint(ds.isel(time=i))
+                    for i in range(ds.sizes["time"])
+                ]
+            )
+        Fxy = self.calc_model_frame(
+            {name: var.data for name, var in ds.items()},
+        )
+        return self.normalize_block(Fxy, wind_direction=ds["wind_direction"].data)
+
+    def calc_cached_footprint(self, ds) -> np.ndarray:
+        """Normalized (x, y) footprint of the single timestep ``ds``, served from
+        the cache when a timestep with the same quantized inputs was seen."""
+        frame_key, footprint_key, values = self.cache.quantize(
+            {name: ds[name].item() for name in self.parameters},
+            context=self.cache_context,
+        )
+        footprint = self.cache.get(footprint_key)
+        if footprint is None:
+            Fxy = self.cache.get(frame_key)
+            if Fxy is None:
+                Fxy = self.calc_model_frame(
+                    {name: np.array([value]) for name, value in values.items()}
+                )[0]
+                self.cache.put(frame_key, Fxy)
+            footprint = self.normalize_block(
+                Fxy[np.newaxis], wind_direction=np.array([values["wind_direction"]])
+            )[0]
+            self.cache.put(footprint_key, footprint)
+        return footprint
+
+    @property
+    def cache_context(self):
+        """Everything besides the model parameters that a cached footprint
+        depends on."""
+        return (
+            type(self).__name__,
+            self.instrument_height,
+            self.roughness_length,
+        ) + self.grid.key
+
+    def calc_model_frame(self, params) -> np.ndarray:
+        """Model-frame footprints as a (time, x, y) array from a mapping of
+        parameter arrays along time (or scalars)."""
+        params = {
+            name: np.asarray(value, dtype=self.dtype)[..., np.newaxis, np.newaxis]
+            for name, value in params.items()
+        }
+        return self.calc_Fxy(
+            params,
+            x=self.domain.x.data[:, np.newaxis],
+            y=self.domain.y.data[np.newaxis, :],
+            xx=self.domain.xx.data.T,
+            yy=self.domain.yy.data.T,
         )
-        datasets = []
-        for timestep in self.ds.time:
-            timestep_ds = normalize_domain(
-                self.ds["Fxy"].sel(time=timestep),
-                wind_direction=ds["wind_direction"].sel(time=timestep).data,
-                query_points=query_points,
-                template_xx=template_xx,
-                template_x=template_x,
-                template_y=template_y,
-                workers=workers,
+
+    def normalize_block(self, Fxy, *, wind_direction) -> np.ndarray:
+        """Rotate, resample and normalize a (time, x, y) block of model-frame
+        footprints onto the template grid."""
+        with self.stage("resample") as record:
+            if self.resampling_table is not None:
+                footprints = self.resampling_table.resample(
+                    Fxy,
+                    wind_direction=wind_direction,
+                    output_shape=self.template_xx.shape,
+                )
+            else:
+                footprints = resample_block(
+                    Fxy,
+                    x=self.domain.x.data,
+                    y=self.domain.y.data,
+                    wind_direction=wind_direction,
+                    query_points=self.query_points,
+                    output_shape=self.template_xx.shape,
+                    method=self.resampling,
+                    workers=self.workers,
+                    profile=self.profile,
+                )
+            record.add(footprints)
+        with self.stage("normalize") as record:
+            footprints = footprints.astype(self.dtype, copy=False)
+            footprints[np.isnan(footprints)] = 0
+            return record.add(
+                footprints / footprints.sum(axis=1).sum(axis=1)[:, None, None]
             )
-            timestep_ds = timestep_ds.fillna(0)
-            timestep_ds = timestep_ds.expand_dims(dim={"time": [timestep.values]})
-            timestep_ds = sum_one(timestep_ds)
-            datasets.append(timestep_ds)
-        self.footprints = xr.concat(datasets, dim="time")
+
+    def wrap_footprints(self, data, time):
+        da = xr.DataArray(data, dims=("time", "x", "y"))
+        da = da.assign_coords(time=time)
+        da = da.assign_coords(x=self.template_x)
+        da = da.assign_coords(y=self.template_y)
+        return da
 
     @abstractmethod
     def calc_parameters(self):
         self.ds["zeta"] = self.instrument_height / self.ds["monin_obukhov_length"]
 
+    def stability(self) -> np.ndarray:
+        """Stability parameter of each timestep that the model's regimes are
+        defined on, ``z / L`` unless the model scales it differently."""
+        return (self.instrument_height / self.ds["monin_obukhov_length"]).data
+
     @abstractmethod
-    def calc_Fx(self):
+    def calc_Fx(self, ds, *, x):
         raise NotImplementedError()
 
     @abstractmethod
-    def calc_Dxy(self):
+    def calc_sigma_y(self, ds, *, x):
         raise NotImplementedError()
 
-    def calc_Fxy(self):
-        self.ds["Fxy"] = self.Fx * self.Dxy
+    def calc_Dxy(self, ds, *, xx, yy):
+        sigma_y = self.calc_sigma_y(ds, x=xx)
+        return (1 / (np.sqrt(2 * np.pi) * sigma_y)) * np.exp(
+            (-0.5) * ((yy / sigma_y) ** 2)
+        )
+
+    def calc_Fxy(self, ds, *, x, y, xx, yy):
+        """Model-frame footprint on the along-wind ``x`` and crosswind ``y`` axes
+        and the (x, y) grid ``xx``/``yy``, either as xarray objects or as
+        broadcastable arrays.
+
+        With ``separable``, Fx and sigma_y, which only depend on x, are evaluated
+        once per column and only the crosswind Gaussian is evaluated per cell.
+        """
+        with self.stage("calc_Fxy") as record:
+            with self.stage("calc_Fx") as Fx_record:
+                Fx = Fx_record.add(self.calc_Fx(ds, x=x))
+            if self.separable:
+                with self.stage("calc_sigma_y") as sigma_record:
+                    sigma_y = sigma_record.add(self.calc_sigma_y(ds, x=x))
+                profile = Fx / (np.sqrt(2 * np.pi) * sigma_y)
+                return record.add(profile * np.exp((-0.5) * ((y / sigma_y) ** 2)))
+            with self.stage("calc_Dxy") as Dxy_record:
+                Dxy = Dxy_record.add(self.calc_Dxy(ds, xx=xx, yy=yy))
+            return record.add(Fx * Dxy)
 
 
 class HsiehFootprintModel(FootprintModel):
+    parameters = (
+        "D",
+        "P",
+        "zu",
+        "monin_obukhov_length",
+        "friction_velocity",
+        "cross_wind_variance",
+        "wind_direction",
+    )
+    inputs = (
+        "friction_velocity",
+        "cross_wind_variance",
+        "monin_obukhov_length",
+        "wind_direction",
+    )
+
     def __init__(
         self,
         data,
@@ -80,6 +567,18 @@ class HsiehFootprintModel(FootprintModel):
         domain_length: int,
         resolution: int,
         workers: int,
+        resampling: str = "idw",
+        engine: str = "xarray",
+        block_size: int = 16,
+        executor: Optional[str] = None,
+        chunk_size: int = 64,
+        cache: Optional[FootprintCache] = None,
+        dtype=np.float64,
+        separable: bool = False,
+        direction_step: Optional[float] = None,
+        spacing="uniform",
+        grid: Optional[FootprintGrid] = None,
+        profile: Optional[FootprintProfile] = None,
     ):
         super().__init__(
             data,
@@ -88,6 +587,18 @@ class HsiehFootprintModel(FootprintModel):
             domain_length=domain_length,
             resolution=resolution,
             workers=workers,
+            resampling=resampling,
+            engine=engine,
+            block_size=block_size,
+            executor=executor,
+            chunk_size=chunk_size,
+            cache=cache,
+            dtype=dtype,
+            separable=separable,
+            direction_step=direction_step,
+            spacing=spacing,
+            grid=grid,
+            profile=profile,
         )
 
     def calc_parameters(self):
@@ -103,35 +614,55 @@ class HsiehFootprintModel(FootprintModel):
         self.ds["P"] = xr.where(self.ds["zeta_H"] < -0.02, 0.59, 1)
         self.ds["P"] = xr.where(self.ds["zeta_H"] > 0.02, 1.33, self.ds["P"])
 
-    def calc_Dxy(self):
-        sigma_y = (
+    def stability(self) -> np.ndarray:
+        """``zu / L``, whose thresholds select the stable, neutral or unstable
+        coefficients ``D`` and ``P``."""
+        return (self.ds["zu"] / self.ds["monin_obukhov_length"]).data
+
+    def calc_sigma_y(self, ds, *, x):
+        return (
             0.3
             * self.roughness_length
-            * np.sqrt(self.ds["cross_wind_variance"])
-            / self.ds["friction_velocity"]
-        ) * ((self.domain.xx / self.roughness_length) ** 0.86)
-        self.Dxy = (1 / (np.sqrt(2 * np.pi) * sigma_y)) * np.exp(
-            (-0.5) * ((self.domain.yy / sigma_y) ** 2)
-        )
-
-    def calc_Fx(self):
-        self.Fx = (
-            (1 / (0.41 * 0.41 * self.domain.x * self.domain.x))
-            * self.ds["D"]
-            * (self.ds["zu"] ** self.ds["P"])
-            * (np.abs(self.ds["monin_obukhov_length"]) ** (1 - self.ds["P"]))
+            * np.sqrt(ds["cross_wind_variance"])
+            / ds["friction_velocity"]
+        ) * ((x / self.roughness_length) ** 0.86)
+
+    def calc_Fx(self, ds, *, x):
+        return (
+            (1 / (0.41 * 0.41 * x * x))
+            * ds["D"]
+            * (ds["zu"] ** ds["P"])
+            * (np.abs(ds["monin_obukhov_length"]) ** (1 - ds["P"]))
             * np.exp(
                 (
-                    -self.ds["D"]
-                    * (self.ds["zu"] ** self.ds["P"])
-                    * (np.abs(self.ds["monin_obukhov_length"]) ** (1 - self.ds["P"]))
+                    -ds["D"]
+                    * (ds["zu"] ** ds["P"])
+                    * (np.abs(ds["monin_obukhov_length"]) ** (1 - ds["P"]))
                 )
-                / (0.41 * 0.41 * self.domain.x)
+                / (0.41 * 0.41 * x)
             )
         )
 
 
 class KormannMeixnerFootprintModel(FootprintModel):
+    parameters = (
+        "m",
+        "r",
+        "U",
+        "kappa",
+        "xi",
+        "mu",
+        "cross_wind_variance",
+        "wind_direction",
+    )
+    inputs = (
+        "friction_velocity",
+        "wind_speed",
+        "cross_wind_variance",
+        "monin_obukhov_length",
+        "wind_direction",
+    )
+
     def __init__(
         self,
         data,
@@ -141,6 +672,18 @@ class KormannMeixnerFootprintModel(FootprintModel):
         domain_length: int,
         resolution: int,
         workers: int,
+        resampling: str = "idw",
+        engine: str = "xarray",
+        block_size: int = 16,
+        executor: Optional[str] = None,
+        chunk_size: int = 64,
+        cache: Optional[FootprintCache] = None,
+        dtype=np.float64,
+        separable: bool = False,
+        direction_step: Optional[float] = None,
+        spacing="uniform",
+        grid: Optional[FootprintGrid] = None,
+        profile: Optional[FootprintProfile] = None,
     ):
         super().__init__(
             data,
@@ -149,6 +692,18 @@ class KormannMeixnerFootprintModel(FootprintModel):
             domain_length=domain_length,
             resolution=resolution,
             workers=workers,
+            resampling=resampling,
+            engine=engine,
+            block_size=block_size,
+            executor=executor,
+            chunk_size=chunk_size,
+            cache=cache,
+            dtype=dtype,
+            separable=separable,
+            direction_step=direction_step,
+            spacing=spacing,
+            grid=grid,
+            profile=profile,
         )
 
     def calc_parameters(self):
@@ -195,26 +750,30 @@ class KormannMeixnerFootprintModel(FootprintModel):
         )
         self.ds["mu"] = (1 + self.ds["m"]) / self.ds["r"]
 
-    def calc_Dxy(self):
+    def calc_sigma_y(self, ds, *, x):
+        # scipy is only imported by the models that use it
+        from scipy.special import gamma
+
         u_bar = (
-            gamma(self.ds["mu"])
-            / (gamma(1 / self.ds["r"]))
-            * (
-                (self.ds["kappa"] * (self.ds["r"] ** 2) / self.ds["U"])
-                ** (self.ds["m"] / self.ds["r"])
-            )
-            * (self.ds["U"] * (self.domain.xx ** (self.ds["m"] / self.ds["r"])))
-        )
-        sigma_y = np.sqrt(self.ds["cross_wind_variance"]) * self.domain.xx / u_bar
-        self.sigma_y = sigma_y
-        self.Dxy = (1 / (np.sqrt(2 * np.pi) * sigma_y)) * np.exp(
-            (-0.5) * ((self.domain.yy / sigma_y) ** 2)
+            gamma(ds["mu"])
+            / (gamma(1 / ds["r"]))
+            * ((ds["kappa"] * (ds["r"] ** 2) / ds["U"]) ** (ds["m"] / ds["r"]))
+            * (ds["U"] * (x ** (ds["m"] / ds["r"])))
         )
+        return np.sqrt(ds["cross_wind_variance"]) * x / u_bar
+
+    def calc_Fx(self, ds, *, x):
+        from scipy.special import gamma
 
-    def calc_Fx(self):
-        self.Fx = (
-            (1 / (gamma(self.ds["mu"])))
-            * (self.ds["xi"] ** self.ds["mu"])
-            / (self.domain.x ** (1 + self.ds["mu"]))
-            * np.exp(-self.ds["xi"] / self.domain.x)
+        return (
+            (1 / (gamma(ds["mu"])))
+            * (ds["xi"] ** ds["mu"])
+            / (x ** (1 + ds["mu"]))
+            * np.exp(-ds["xi"] / x)
         )
+
+
+MODELS = {
+    "Hsieh": HsiehFootprintModel,
+    "Kormann & Meixner": KormannMeixnerFootprintModel,
+}
@@ -0,0 +1,104 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+_models = None
+
+
+def _init_worker(models):
+    global _models
+    _models = models
+
+
+def _calc_chunk(key, ds):
+    # the timesteps are sent with every chunk, so that a pool kept open (e.g.
+    # by a FootprintSession) computes timesteps added after it started
+    model = _models[key]
+    model.ds = ds
+    if model.profile is None:
+        return model.calc_footprints(ds), None
+    # the stages of each chunk are sent back with it and merged into the
+    # caller's profile
+    model.profile.clear()
+    chunk = model.calc_footprints(ds)
+    return chunk, model.profile.stages
+
+
+def resolve_workers(workers: int) -> int:
+    return os.cpu_count() if workers == -1 else workers
+
+
+def map_chunks(model, *, executor: str, workers: int, chunk_size: int):
+    """Compute the footprints of ``model`` in chunks of ``chunk_size`` timesteps
+    on a pool of ``workers`` and yield them in time order.
+
+    Each chunk is computed independently with the model's serial code path, so
+    the concatenated chunks are identical to the serial result. At most two
+    chunks per worker are in flight, which bounds memory when the consumer
+    reduces the chunks as they arrive.
+    """
+    for _, chunk in map_model_chunks(
+        {None: model}, executor=executor, workers=workers, chunk_size=chunk_size
+    ):
+        yield chunk
+
+
+def start_pool(models: dict, *, executor: str, workers: int):
+    """Pool of ``workers`` processes or threads for the chunks of ``models``.
+
+    Process workers receive the models (with their grids) once, when they
+    start, and the timesteps of each chunk with the chunk.
+    """
+    workers = resolve_workers(workers)
+    if executor == "process":
+        return ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker, initargs=(models,)
+        )
+    if executor == "thread":
+        return ThreadPoolExecutor(max_workers=workers)
+    raise ValueError(f"Unknown executor {executor!r}, expected 'process' or 'thread'.")
+
+
+def map_model_chunks(
+    models: dict, *, executor: str, workers: int, chunk_size: int, pool=None
+):
+    """Compute the footprints of several models on one pool, as in
+    :func:`map_chunks`, and yield each chunk with its model's key, in the order
+    of ``models`` and then of time.
+
+    ``pool`` is a pool from :func:`start_pool` for the same models to run the
+    chunks on and leave open. Default: a pool started for this call only.
+    """
+    workers = resolve_workers(workers)
+    owned = pool is None
+    if owned:
+        pool = start_pool(models, executor=executor, workers=workers)
+    if isinstance(pool, ProcessPoolExecutor):
+        calc_chunk = _calc_chunk
+    else:
+
+        def calc_chunk(key, ds):
+            return models[key].calc_footprints(ds), None
+
+    def collect(key, future):
+        chunk, stages = future.result()
+        if stages is not None:
+            models[key].profile.merge(stages)
+        return key, chunk
+
+    futures = deque()
+    try:
+        for key, model in models.items():
+            for start in range(0, model.ds.sizes["time"], chunk_size):
+                if len(futures) >= 2 * workers:
+                    yield collect(*futures.popleft())
+                chunk = model.ds.isel(time=slice(start, start + chunk_size))
+                futures.append((key, pool.submit(calc_chunk, key, chunk)))
+        while futures:
+            yield collect(*futures.popleft())
+    finally:
+        if owned:
+            pool.shutdown(cancel_futures=True)
+        else:
+            for _, future in futures:
+                future.cancel()
@@ -0,0 +1,120 @@
+from typing import Optional
+
+import xarray as xr
+from eddy_footprint.models import MODELS
+
+
+class ParametricFootprints:
+    """Footprints stored as the few model parameters of each timestep.
+
+    A Hsieh or Kormann & Meixner footprint is fully defined by its along-wind
+    parameters, the crosswind spread and the wind direction, so instead of a dense
+    grid only these (7 or 8 floats per timestep) are kept in :attr:`ds`, together
+    with the site constants and model name in its attributes. Dense footprints are
+    computed on demand with :meth:`rasterize`.
+
+    ``ds`` can be written with :meth:`xarray.Dataset.to_netcdf` and read back with
+    ``ParametricFootprints(xr.open_dataset(path))``.
+
+    Parameters
+    ----------
+    ds : xarray.Dataset
+        Dataset with the parameters of the model named by its ``method`` attribute
+        along a time dimension, and ``instrument_height`` and ``roughness_length``
+        attributes.
+    """
+
+    def __init__(self, ds: xr.Dataset):
+        self.ds = ds
+
+    @classmethod
+    def from_model(cls, model, *, method: str) -> "ParametricFootprints":
+        ds = model.ds[list(model.parameters)]
+        ds.attrs = dict(
+            method=method,
+            instrument_height=model.instrument_height,
+            roughness_length=model.roughness_length,
+        )
+        return cls(ds)
+
+    @property
+    def method(self) -> str:
+        return self.ds.attrs["method"]
+
+    def __len__(self):
+        return self.ds.sizes["time"]
+
+    def __repr__(self):
+        return (
+            f"<ParametricFootprints method={self.method!r} "
+            f"time={len(self)} parameters={list(self.ds.data_vars)}>"
+        )
+
+    def rasterize(
+        self,
+        time=None,
+        *,
+        domain_length: Optional[int] = 1000,
+        resolution: Optional[int] = 5,
+        workers: Optional[int] = 1,
+        **kwargs,
+    ) -> xr.DataArray:
+        """Compute dense footprints for some or all timesteps.
+
+        Parameters
+        ----------
+        time : optional
+            Timestep, list or slice of times to rasterize, as accepted by
+            :meth:`xarray.Dataset.sel`. A single timestep returns an (x, y) grid.
+            Default: all timesteps.
+        domain_length : int, optional
+            Domain length in meters of the output grid. Default: 1000.
+        resolution : int, optional
+            Resolution in meters of the output grid. Default: 5.
+        workers : int, optional
+            Number of workers, as in :func:`calc_footprint`. Default: 1.
+        **kwargs
+            Further options of :func:`calc_footprint`, such as ``resampling``,
+            ``engine`` or ``executor``.
+
+        Returns
+        -------
+        da: xarray.DataArray
+            DataArray with footprints of influence.
+        """
+        ds = self.ds if time is None else self.ds.sel(time=time)
+        single = "time" not in ds.dims
+        if single:
+            ds = ds.expand_dims("time")
+        model = self.to_model(
+            ds,
+            domain_length=domain_length,
+            resolution=resolution,
+            workers=workers,
+            **kwargs,
+        )
+        da = model.footprints
+        return da.isel(time=0) if single else da
+
+    def to_model(
+        self,
+        ds: Optional[xr.Dataset] = None,
+        *,
+        domain_length: Optional[int] = 1000,
+        resolution: Optional[int] = 5,
+        workers: Optional[int] = 1,
+        **kwargs,
+    ):
+        """Footprint model of the parameters in ``ds`` (default: all of
+        :attr:`ds`) on a grid of ``domain_length`` and ``resolution``, with further
+        options of :func:`calc_footprint` as keyword arguments."""
+        ds = self.ds if ds is None else ds
+        return MODELS[self.method](
+            ds.copy(),
+            instrument_height=self.ds.attrs["instrument_height"],
+            roughness_length=self.ds.attrs["roughness_length"],
+            domain_length=domain_length,
+            resolution=resolution,
+            workers=workers,
+            **kwargs,
+        )
@@ -0,0 +1,149 @@
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Optional
+
+import numpy as np
+import xarray as xr
+
+
+class StageRecord:
+    """Bytes produced inside one ``with profile.stage(name)`` block."""
+
+    __slots__ = ("nbytes",)
+
+    def __init__(self):
+        self.nbytes = 0
+
+    def add(self, value):
+        """Count the bytes of an array (or a tuple of arrays) produced by the
+        stage and return it unchanged."""
+        values = value if isinstance(value, tuple) else (value,)
+        self.nbytes += sum(getattr(item, "nbytes", 0) for item in values)
+        return value
+
+
+class _NullRecord:
+    __slots__ = ()
+
+    def add(self, value):
+        return value
+
+
+_NULL_STAGE = nullcontext(_NullRecord())
+
+
+class FootprintProfile:
+    """Wall time, call counts and bytes produced by each stage of a footprint
+    run.
+
+    Pass one to :func:`calc_footprint` (or a model) to have it filled in as the
+    footprints are computed, then read it with :meth:`to_dataset`. Stages
+    nest: ``calc_Fxy`` includes ``calc_Fx`` and ``calc_Dxy`` (or
+    ``calc_sigma_y``), and ``resample`` includes ``rotate`` and the
+    ``kdtree_build`` and ``kdtree_query`` of ``idw`` resampling. Bytes are the
+    sizes of the arrays each stage returns, not the temporaries it allocates.
+
+    With a thread executor all threads record into the same profile. With a
+    process executor each worker records into its own copy, which is merged into
+    this one as each chunk is returned, and ``callback`` runs in the worker (so
+    it must be picklable).
+
+    Parameters
+    ----------
+    callback : callable, optional
+        Called as ``callback(stage, seconds, nbytes)`` after every call of a
+        stage, e.g. to forward timings to a metrics system.
+    """
+
+    def __init__(self, *, callback: Optional[Callable] = None):
+        self.callback = callback
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.stages)
+
+    def __repr__(self):
+        lines = [f"<FootprintProfile stages={len(self)}>"]
+        ds = self.to_dataset()
+        for name in ds.stage.data:
+            entry = ds.sel(stage=name)
+            lines.append(
+                f"  {name:<16}{int(entry.calls):>8} calls"
+                f"{float(entry.seconds):>10.3f} s"
+                f"{int(entry.bytes) / 2**20:>10.1f} MiB"
+            )
+        return "\n".join(lines)
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time the body of a ``with`` block as one call of stage ``name``; the
+        :class:`StageRecord` it yields counts the bytes produced."""
+        record = StageRecord()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            self.record(name, time.perf_counter() - start, record.nbytes)
+
+    def record(self, name: str, seconds: float, nbytes: int = 0):
+        """Add one call of stage ``name`` to the profile."""
+        self._add(name, calls=1, seconds=seconds, nbytes=nbytes)
+        if self.callback is not None:
+            self.callback(name, seconds, nbytes)
+
+    def merge(self, stages: dict):
+        """Add the :attr:`stages` of another profile, e.g. of a worker process."""
+        for name, entry in stages.items():
+            self._add(
+                name,
+                calls=entry["calls"],
+                seconds=entry["seconds"],
+                nbytes=entry["bytes"],
+            )
+
+    def _add(self, name, *, calls, seconds, nbytes):
+        with self._lock:
+            entry = self.stages.setdefault(
+                name, {"calls": 0, "seconds": 0.0, "bytes": 0}
+            )
+            entry["calls"] += calls
+            entry["seconds"] += seconds
+            entry["bytes"] += nbytes
+
+    def clear(self):
+        with self._lock:
+            self.stages = {}
+
+    def to_dataset(self) -> xr.Dataset:
+        """Profile as a Dataset along a ``stage`` dimension, slowest first, with
+        the ``calls``, total ``seconds`` and ``bytes`` of each stage."""
+        names = sorted(self.stages, key=lambda name: -self.stages[name]["seconds"])
+        ds = xr.Dataset(coords=dict(stage=np.array(names, dtype=str)))
+        for variable, dtype in (
+            ("calls", np.int64),
+            ("seconds", float),
+            ("bytes", np.int64),
+        ):
+            ds[variable] = (
+                "stage",
+                np.array([self.stages[name][variable] for name in names], dtype=dtype),
+            )
+        ds["seconds"].attrs["units"] = "s"
+        ds["bytes"].attrs["units"] = "B"
+        return ds
+
+
+def stage(profile: Optional[FootprintProfile], name: str):
+    """``profile.stage(name)``, or a no-op context when not profiling."""
+    return _NULL_STAGE if profile is None else profile.stage(name)
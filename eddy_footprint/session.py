@@ -0,0 +1,162 @@
+from typing import Literal, Optional
+
+import numpy as np
+import xarray as xr
+from eddy_footprint.core import build_dataset, model_class
+from eddy_footprint.parallel import map_model_chunks, start_pool
+from eddy_footprint.store import append_to_zarr, has_variable
+
+
+class FootprintSession:
+    """Footprint model that is set up once and fed new timesteps as they arrive.
+
+    The model domain, the template grid and its query points are built when the
+    session is created and reused by every :meth:`append`, so the cost of an
+    update only depends on the number of new timesteps, not on how many were
+    appended before. Footprints can optionally be appended to a Zarr store as
+    they are computed.
+
+    With an ``executor``, one pool of workers is started on the first
+    :meth:`append` and kept for the life of the session, so updates do not pay
+    for starting workers and sending them the grid. Close the session with
+    :meth:`close`, or use it as a context manager, to stop the workers.
+
+    Parameters
+    ----------
+    instrument_height : float
+        Constant for the instrument (sonic anemometer) height in meters above ground.
+    roughness_length : float
+        Constant for the site roughness length (z_not) in meters.
+    domain_length : int, optional
+        Domain length in meters, as in :func:`calc_footprint`. Default: 1000.
+    resolution : int, optional
+        Resolution in meters, as in :func:`calc_footprint`. Default: 5.
+    workers : int, optional
+        Number of workers, as in :func:`calc_footprint`. Default: 1.
+    method : ``Hsieh`` or ``Kormann & Meixner``, optional
+        The footprint model method to use. Default: Hsieh.
+    store : str or MutableMapping, optional
+        Path or mapping of a Zarr store to which the footprints of every
+        :meth:`append` are appended along time, in a variable ``footprint`` with
+        one chunk per timestep. The store is created on the first append, and an
+        existing one is extended. Requires ``zarr``. Default: None.
+    **kwargs
+        Further options of :func:`calc_footprint`, such as ``resampling``,
+        ``engine``, ``executor``, ``cache`` or ``dtype``.
+    """
+
+    def __init__(
+        self,
+        *,
+        instrument_height: float,
+        roughness_length: float,
+        domain_length: Optional[int] = 1000,
+        resolution: Optional[int] = 5,
+        workers: Optional[int] = 1,
+        method: Optional[Literal["Hsieh", "Kormann & Meixner"]] = "Hsieh",
+        store=None,
+        **kwargs,
+    ):
+        model_type = model_class(method)
+        # an empty dataset that already holds every parameter, so that setting
+        # up the model does not derive any
+        empty = xr.Dataset(
+            {name: ("time", np.empty(0)) for name in model_type.parameters},
+            coords=dict(time=[]),
+        )
+        self.method = method
+        self.model = model_type(
+            empty,
+            instrument_height=instrument_height,
+            roughness_length=roughness_length,
+            domain_length=domain_length,
+            resolution=resolution,
+            workers=workers,
+            **kwargs,
+        )
+        self.store = store
+        self._store_exists = None
+        self._pool = None
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def __repr__(self):
+        return f"<FootprintSession method={self.method!r} time={len(self)}>"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Stop the session's workers, if it has any."""
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+    def append(
+        self,
+        *,
+        air_pressure: np.ndarray,
+        air_temperature: np.ndarray,
+        friction_velocity: np.ndarray,
+        wind_speed: np.ndarray,
+        cross_wind_variance: np.ndarray,
+        wind_direction: np.ndarray,
+        monin_obukhov_length: np.ndarray,
+        time: np.ndarray,
+    ) -> xr.DataArray:
+        """Compute the footprints of new timesteps.
+
+        Parameters are the measurement arrays of :func:`calc_footprint`.
+
+        Returns
+        -------
+        da: xarray.DataArray
+            DataArray with the footprints of influence of the new timesteps only.
+        """
+        ds = build_dataset(
+            air_pressure=air_pressure,
+            air_temperature=air_temperature,
+            friction_velocity=friction_velocity,
+            wind_speed=wind_speed,
+            cross_wind_variance=cross_wind_variance,
+            wind_direction=wind_direction,
+            monin_obukhov_length=monin_obukhov_length,
+            time=time,
+        )
+        self.model.ds = ds
+        self.model.calc_parameters()
+        self.model.classify()
+        if self.model.executor is not None:
+            models = {None: self.model}
+            if self._pool is None:
+                self._pool = start_pool(
+                    models,
+                    executor=self.model.executor,
+                    workers=self.model.max_workers,
+                )
+            chunks = map_model_chunks(
+                models,
+                executor=self.model.executor,
+                workers=self.model.max_workers,
+                chunk_size=self.model.chunk_size,
+                pool=self._pool,
+            )
+            da = xr.concat([chunk for _, chunk in chunks], dim="time")
+        else:
+            da = self.model.calc_footprints(self.model.ds)
+        if self.store is not None:
+            self.write(da)
+        self.count += da.sizes["time"]
+        return da
+
+    def write(self, da: xr.DataArray):
+        """Append footprints to the session's store."""
+        if self._store_exists is None:
+            self._store_exists = has_variable(self.store, "footprint")
+        append_to_zarr(da, self.store, exists=self._store_exists)
+        self._store_exists = True
@@ -0,0 +1,89 @@
+from typing import Literal, Mapping, Optional
+
+import numpy as np
+import xarray as xr
+from eddy_footprint.core import MEASUREMENTS, build_dataset, model_class
+from eddy_footprint.parallel import map_model_chunks
+from eddy_footprint.spatial import FootprintGrid
+
+
+def calc_sites(
+    sites: Mapping[str, Mapping],
+    *,
+    workers: Optional[int] = 1,
+    executor: Optional[Literal["process", "thread"]] = None,
+    chunk_size: Optional[int] = 64,
+    **kwargs,
+) -> dict:
+    """Footprints of several sites (towers) in one batch.
+
+    Sites with the same grid settings (``domain_length``, ``resolution``,
+    ``dtype``, ``resampling`` and ``direction_step``) share one model domain,
+    template grid and resampling table, and with an ``executor`` the timesteps
+    of all sites are scheduled in chunks on a single pool.
+
+    .. warning::
+        This function is experimental and its signature may change.
+
+    Parameters
+    ----------
+    sites : mapping
+        Mapping of site names to the keyword arguments of :func:`calc_footprint`
+        for that site: the measurement arrays, ``instrument_height`` and
+        ``roughness_length``, and optionally any per-site option such as
+        ``method`` or ``domain_length``.
+    workers : int, optional
+        Number of workers, as in :func:`calc_footprint`. Default: 1.
+    executor : ``process`` or ``thread``, optional
+        Compute the chunks of all sites in parallel on one pool of ``workers``
+        processes or threads. Default: None (serial).
+    chunk_size : int, optional
+        Number of timesteps per parallel task. Default: 64.
+    **kwargs
+        Options of :func:`calc_footprint` shared by all sites, such as
+        ``domain_length``, ``resolution``, ``method`` or ``resampling``. Options
+        given for a site take precedence.
+
+    Returns
+    -------
+    footprints: dict
+        Mapping of site names to DataArrays with their footprints of influence,
+        in the order of ``sites``.
+    """
+    grids = {}
+    models = {}
+    for site, values in sites.items():
+        options = {"domain_length": 1000, "resolution": 5, **kwargs, **values}
+        ds = build_dataset(**{name: options.pop(name) for name in MEASUREMENTS})
+        try:
+            model_type = model_class(options.pop("method", "Hsieh"))
+        except ValueError as err:
+            raise ValueError(f"Site {site!r}: {err}") from err
+        settings = dict(
+            domain_length=options["domain_length"],
+            resolution=options["resolution"],
+            dtype=np.dtype(options.get("dtype", "float64")),
+            resampling=options.get("resampling", "idw"),
+            direction_step=options.get("direction_step"),
+            spacing=options.get("spacing", "uniform"),
+        )
+        key = FootprintGrid.settings_key(**settings)
+        if key not in grids:
+            grids[key] = FootprintGrid(
+                **settings, workers=workers if executor is None else 1
+            )
+        # the batch runs the pool, so every model computes serially
+        models[site] = model_type(
+            ds,
+            workers=workers if executor is None else 1,
+            grid=grids[key],
+            **options,
+        )
+    if executor is None:
+        return {site: model.calc_footprints(model.ds) for site, model in models.items()}
+    chunks = {site: [] for site in models}
+    for site, chunk in map_model_chunks(
+        models, executor=executor, workers=workers, chunk_size=chunk_size
+    ):
+        chunks[site].append(chunk)
+    return {site: xr.concat(chunks[site], dim="time") for site in models}
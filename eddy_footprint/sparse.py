@@ -0,0 +1,194 @@
+from typing import Iterable, Literal
+
+import numpy as np
+import xarray as xr
+
+
+def source_cells(footprint: np.ndarray, *, cutoff: float) -> np.ndarray:
+    """Flat indices of the fewest cells of ``footprint`` that together hold at
+    least a ``cutoff`` fraction of its total weight, strongest first."""
+    flat = footprint.ravel()
+    nonzero = np.flatnonzero(flat > 0)
+    order = nonzero[np.argsort(flat[nonzero])[::-1]]
+    cumulative = np.cumsum(flat[order])
+    if len(cumulative) == 0:
+        return order
+    n = np.searchsorted(cumulative, cutoff * cumulative[-1]) + 1
+    return order[: min(n, len(order))]
+
+
+class SparseFootprints:
+    """Footprints truncated to the cells that hold most of their weight.
+
+    Each timestep keeps only the cells covering a ``cutoff`` fraction of its total
+    influence, either as a list of cells (``coo``) or as the dense crop of their
+    bounding box (``bbox``). Kept values are not renormalized, so each timestep
+    sums to at least ``cutoff``. All data live in :attr:`ds` along a ``cell``
+    dimension, with the number of cells of each timestep in ``count``; it can be
+    written with :meth:`xarray.Dataset.to_netcdf` and read back with
+    ``SparseFootprints(xr.open_dataset(path))``.
+
+    Parameters
+    ----------
+    ds : xarray.Dataset
+        Dataset as built by :meth:`from_footprints`.
+    """
+
+    def __init__(self, ds: xr.Dataset):
+        self.ds = ds
+
+    @classmethod
+    def from_footprints(
+        cls,
+        footprints: Iterable[xr.DataArray],
+        *,
+        cutoff: float,
+        format: Literal["coo", "bbox"] = "coo",
+    ) -> "SparseFootprints":
+        """Truncate (time, x, y) footprints one at a time as they are iterated."""
+        if not 0 < cutoff <= 1:
+            raise ValueError(f"cutoff must be in (0, 1], got {cutoff}.")
+        if format not in ("coo", "bbox"):
+            raise ValueError(f"Unknown sparse format {format!r}.")
+        times, counts, values, indices, bounds = [], [], [], [], []
+        da = None
+        for da in footprints:
+            for footprint in da:
+                data = footprint.data
+                cells = source_cells(data, cutoff=cutoff)
+                x_index, y_index = np.unravel_index(cells, data.shape)
+                if format == "coo":
+                    indices.append((x_index, y_index))
+                    values.append(data.ravel()[cells])
+                else:
+                    box = (
+                        (
+                            x_index.min(),
+                            x_index.max() + 1,
+                            y_index.min(),
+                            y_index.max() + 1,
+                        )
+                        if len(cells)
+                        else (0, 0, 0, 0)
+                    )
+                    bounds.append(box)
+                    values.append(data[box[0] : box[1], box[2] : box[3]].ravel())
+                times.append(footprint.time.data)
+                counts.append(len(values[-1]))
+        if da is None:
+            raise ValueError("No footprints to truncate.")
+        ds = xr.Dataset(coords=dict(time=np.array(times), x=da.x.data, y=da.y.data))
+        ds["count"] = ("time", np.array(counts, dtype=np.int64))
+        ds["value"] = ("cell", np.concatenate(values))
+        if format == "coo":
+            ds["x_index"] = (
+                "cell",
+                np.concatenate([i[0] for i in indices]).astype(np.int32),
+            )
+            ds["y_index"] = (
+                "cell",
+                np.concatenate([i[1] for i in indices]).astype(np.int32),
+            )
+        else:
+            bounds = np.array(bounds, dtype=np.int32).reshape(-1, 4)
+            for i, name in enumerate(("x_start", "x_stop", "y_start", "y_stop")):
+                ds[name] = ("time", bounds[:, i])
+        ds.attrs = dict(format=format, cutoff=cutoff)
+        return cls(ds)
+
+    @property
+    def format(self) -> str:
+        return self.ds.attrs["format"]
+
+    def __len__(self):
+        return self.ds.sizes["time"]
+
+    def __repr__(self):
+        return (
+            f"<SparseFootprints format={self.format!r} "
+            f"cutoff={self.ds.attrs['cutoff']} time={len(self)} "
+            f"cells={self.ds.sizes['cell']}>"
+        )
+
+    def cells(self):
+        """Time positions, template grid x and y indices and values of all kept
+        cells as flat arrays, in either format."""
+        counts = self.ds["count"].data
+        position = np.repeat(np.arange(len(self)), counts)
+        if self.format == "coo":
+            x_index = self.ds["x_index"].data
+            y_index = self.ds["y_index"].data
+        else:
+            x_index, y_index = [], []
+            bounds = zip(
+                *(
+                    self.ds[name].data
+                    for name in ("x_start", "x_stop", "y_start", "y_stop")
+                )
+            )
+            for x_start, x_stop, y_start, y_stop in bounds:
+                xx, yy = np.meshgrid(
+                    np.arange(x_start, x_stop),
+                    np.arange(y_start, y_stop),
+                    indexing="ij",
+                )
+                x_index.append(xx.ravel())
+                y_index.append(yy.ravel())
+            x_index = np.concatenate(x_index or [[]]).astype(np.int32)
+            y_index = np.concatenate(y_index or [[]]).astype(np.int32)
+        return position, x_index, y_index, self.ds["value"].data
+
+    def to_dense(self, time=None) -> xr.DataArray:
+        """Expand some or all timesteps back into a dense footprint DataArray.
+
+        Parameters
+        ----------
+        time : optional
+            Timestep, list or slice of times, as accepted by
+            :meth:`xarray.Dataset.sel`. A single timestep returns an (x, y) grid.
+            Default: all timesteps.
+
+        Returns
+        -------
+        da: xarray.DataArray
+            DataArray with footprints of influence, zero outside the kept cells
+            and NaN at timesteps whose ``status`` is not ``ok``.
+        """
+        positions = xr.DataArray(
+            np.arange(len(self)), dims="time", coords=dict(time=self.ds.time)
+        )
+        if time is not None:
+            positions = positions.sel(time=time)
+        single = positions.ndim == 0
+        positions = np.atleast_1d(positions.data)
+        offsets = np.concatenate([[0], np.cumsum(self.ds["count"].data)])
+        value = self.ds["value"].data
+        data = np.zeros(
+            (len(positions), self.ds.sizes["x"], self.ds.sizes["y"]), dtype=value.dtype
+        )
+        for i, position in enumerate(positions):
+            cells = slice(offsets[position], offsets[position + 1])
+            if self.format == "coo":
+                data[
+                    i,
+                    self.ds["x_index"].data[cells],
+                    self.ds["y_index"].data[cells],
+                ] = value[cells]
+            else:
+                x_start, x_stop, y_start, y_stop = (
+                    int(self.ds[name][position])
+                    for name in ("x_start", "x_stop", "y_start", "y_stop")
+                )
+                data[i, x_start:x_stop, y_start:y_stop] = value[cells].reshape(
+                    x_stop - x_start, y_stop - y_start
+                )
+        da = xr.DataArray(data, dims=("time", "x", "y"))
+        da = da.assign_coords(time=self.ds.time.data[positions])
+        da = da.assign_coords(x=self.ds.x.data)
+        da = da.assign_coords(y=self.ds.y.data)
+        if "status" in self.ds.coords:
+            status = self.ds["status"].data[positions]
+            # skipped timesteps are NaN, as in the dense footprints
+            data[status != "ok"] = np.nan
+            da = da.assign_coords(status=("time", status))
+        return da.isel(time=0) if single else da
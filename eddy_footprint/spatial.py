@@ -1,78 +1,915 @@
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING
+
 import numpy as np
 import xarray as xr
-from scipy.spatial import KDTree
 
+from eddy_footprint.profiling import stage
 
-def rotate_domain(da, *, wind_direction):
-    rot = -(wind_direction) * np.pi / 180
-    x = da.xx.data * np.cos(rot) + da.yy.data * np.sin(rot)
-    y = -da.xx.data * np.sin(rot) + da.yy.data * np.cos(rot)
-    da = da.assign_coords(x=(("y", "x"), x))
-    da = da.assign_coords(y=(("y", "x"), y))
-    da = da.drop_vars(["xx", "yy"])
-    return da
+if TYPE_CHECKING:
+    from scipy.sparse import csr_matrix
+
+
+def along_wind_axis(*, domain_length: int, resolution: int, spacing="uniform"):
+    """Along-wind axis of the model-frame grid.
 
+    ``uniform`` steps by ``resolution`` from 0. ``log`` starts at a tenth of
+    ``resolution`` and grows each step by a fifth of the distance (a log-spaced
+    axis) until steps reach twice ``resolution``, so that cells are finest near
+    the tower where Fx changes fastest and coarser where it decays slowly. Both
+    end at the same far edge. An array is used as given and must be increasing.
+    """
+    if isinstance(spacing, str):
+        if spacing == "uniform":
+            return np.linspace(
+                0, domain_length - resolution, int(domain_length / resolution)
+            )
+        if spacing == "log":
+            end = domain_length - resolution
+            x = [resolution / 10]
+            while True:
+                step = min(max(x[-1] / 5, resolution / 10), 2 * resolution)
+                if x[-1] + step >= end:
+                    return np.array(x + [end])
+                x.append(x[-1] + step)
+        raise ValueError(
+            f"Unknown along-wind spacing {spacing!r}, expected 'uniform', 'log' "
+            "or an array."
+        )
+    x = np.asarray(spacing, dtype=np.float64)
+    if x.ndim != 1 or len(x) < 2 or np.any(np.diff(x) <= 0):
+        raise ValueError("An along-wind axis must be increasing with 2 or more points.")
+    return x
+
+
+def cell_sizes(axis) -> np.ndarray:
+    """Widths of the cells centred on the points of an increasing axis, which
+    end halfway to the neighbouring points and are mirrored at both ends."""
+    middle = (axis[1:] + axis[:-1]) / 2
+    edges = np.concatenate(
+        [[2 * axis[0] - middle[0]], middle, [2 * axis[-1] - middle[-1]]]
+    )
+    return np.diff(edges)
 
-def build_domain(*, domain_length: int, resolution: int, time: np.ndarray):
-    x = np.linspace(0, domain_length-resolution, int(domain_length / resolution))
+
+def axis_position(axis, values):
+    """Fractional index of ``values`` on an increasing axis, below 0 or above
+    ``len(axis) - 1`` outside it. Regular axes are located arithmetically and
+    others by bisection."""
+    step = axis[1] - axis[0]
+    if np.allclose(np.diff(axis), step):
+        return (values - axis[0]) / step
+    i = np.clip(np.searchsorted(axis, values, side="right") - 1, 0, len(axis) - 2)
+    return i + (values - axis[i]) / (axis[i + 1] - axis[i])
+
+
+def build_domain(
+    *, domain_length: int, resolution: int, dtype=np.float64, spacing="uniform"
+):
+    x = along_wind_axis(
+        domain_length=domain_length, resolution=resolution, spacing=spacing
+    ).astype(dtype)
     y = np.linspace(
-        -(domain_length) / 2+resolution, (domain_length )/ 2, int(domain_length / resolution)
+        -(domain_length) / 2 + resolution,
+        (domain_length) / 2,
+        int(domain_length / resolution),
+        dtype=dtype,
     )
     xx, yy = np.meshgrid(x, y)
-    data = np.zeros(
-        (
-            int(domain_length / resolution),
-            int(domain_length / resolution),
-            len(time),
-        )
+    # coordinates only, footprints are evaluated on them one timestep or block
+    # at a time
+    ds = xr.Dataset()
+    ds = ds.assign_coords(x=(("x"), x))
+    ds = ds.assign_coords(y=(("y"), y))
+    ds = ds.assign_coords(xx=(("y", "x"), xx))
+    ds = ds.assign_coords(yy=(("y", "x"), yy))
+    return ds
+
+
+def nearest_weights(points, *, query_points, workers, profile=None):
+    """Indices of the 4 ``points`` nearest to each query point and their
+    inverse-distance weights, both with shape (n_points, 4)."""
+    # scipy is only imported by the engines that use it
+    from scipy.spatial import KDTree
+
+    with stage(profile, "kdtree_build"):
+        tree = KDTree(points)
+    with stage(profile, "kdtree_query") as record:
+        d, ind = record.add(tree.query(query_points, k=4, workers=workers))
+    with np.errstate(divide="ignore"):
+        w = 1.0 / d**2
+    # a query point on a grid point takes its value alone, so that NaN at
+    # the other neighbours does not spread to it
+    exact = np.isinf(w)
+    on_point = exact.any(axis=1)
+    ind[on_point] = ind[on_point][exact[on_point]][:, np.newaxis]
+    w[on_point] = exact[on_point]
+    return ind, w / w.sum(axis=1, keepdims=True)
+
+
+def resample(da, *, wind_direction, query_points, output_shape, workers, profile=None):
+    """Resample a model-frame (x, y) grid rotated to ``wind_direction`` onto
+    the query points by inverse-distance weighting."""
+    ind, w = idw_weights(
+        x=da.x.data,
+        y=da.y.data,
+        wind_direction=wind_direction,
+        query_points=query_points,
+        workers=workers,
+        profile=profile,
     )
-    da = xr.DataArray(data, dims=("x", "y", "time"))
-    da = da.assign_coords(x=(("x"), x))
-    da = da.assign_coords(y=(("y"), y))
-    da = da.assign_coords(time=(("time"), time))
-    da = da.assign_coords(xx=(("y", "x"), xx))
-    da = da.assign_coords(yy=(("y", "x"), yy))
-    return da
+    output_points = np.sum(w * da.data.flatten()[ind], axis=1)
+    output_points.shape = output_shape
+    return output_points
 
 
-def resample(da, *, query_points, output_shape, workers):
-    points = np.array((da.x.data.flatten(), da.y.data.flatten())).transpose()
-    tree = KDTree(points)
-    d, ind = tree.query(query_points, k=4, workers=workers)
-    w = 1.0 / d**2
-    output_points = np.sum(w * da.data.flatten()[ind], axis=1) / np.sum(w, axis=1)
+def grid_weights(*, x, y, wind_direction, query_points, method):
+    """Interpolation weights from a model grid to rotated query points.
+
+    The rotation of the model grid (as in :func:`idw_weights`) is rigid, so
+    instead of searching the rotated model grid for neighbours, the query points
+    are rotated back into the model frame and located on the ``x``/``y`` axes
+    directly. ``x`` may be
+    irregular, e.g. log-spaced.
+
+    Returns indices into the flattened (x, y) model grid and their weights, both
+    with shape (n_points, 4) for ``bilinear`` and (n_points, 1) for ``nearest``,
+    preceded by the shape of ``wind_direction`` if it is an array. Query points
+    outside the model grid get zero weights.
+    """
+    rot = -np.asarray(wind_direction)[..., np.newaxis] * np.pi / 180
+    xx = query_points[:, 0] * np.cos(rot) - query_points[:, 1] * np.sin(rot)
+    yy = query_points[:, 0] * np.sin(rot) + query_points[:, 1] * np.cos(rot)
+    fx = axis_position(x, xx)
+    fy = (yy - y[0]) / (y[1] - y[0])
+    if method == "nearest":
+        ix = np.rint(fx)
+        iy = np.rint(fy)
+        valid = (ix >= 0) & (ix <= len(x) - 1) & (iy >= 0) & (iy <= len(y) - 1)
+        ind = np.where(valid, ix * len(y) + iy, 0).astype(int)[..., np.newaxis]
+        w = valid.astype(float)[..., np.newaxis]
+    elif method == "bilinear":
+        valid = (fx >= 0) & (fx <= len(x) - 1) & (fy >= 0) & (fy <= len(y) - 1)
+        ix = np.clip(np.floor(fx), 0, len(x) - 2)
+        iy = np.clip(np.floor(fy), 0, len(y) - 2)
+        tx = np.where(valid, fx - ix, 0)
+        ty = np.where(valid, fy - iy, 0)
+        ind = (ix * len(y) + iy).astype(int)[..., np.newaxis] + np.array(
+            [0, 1, len(y), len(y) + 1]
+        )
+        w = np.stack(
+            [(1 - tx) * (1 - ty), (1 - tx) * ty, tx * (1 - ty), tx * ty], axis=-1
+        )
+        w[~valid] = 0
+    else:
+        raise ValueError(f"Unknown resampling method {method!r}.")
+    return ind, w
+
+
+def interpolate(da, *, wind_direction, query_points, output_shape, method):
+    ind, w = grid_weights(
+        x=da.x.data,
+        y=da.y.data,
+        wind_direction=wind_direction,
+        query_points=query_points,
+        method=method,
+    )
+    # the x=0 column of the model grid is 0/0 and contributes nothing
+    output_points = np.nansum(w * da.data.flatten()[ind], axis=1)
     output_points.shape = output_shape
     return output_points
 
 
 def normalize_domain(
-    da, *, wind_direction, query_points, template_xx, template_x, template_y, workers
+    da,
+    *,
+    wind_direction,
+    query_points,
+    template_xx,
+    template_x,
+    template_y,
+    workers,
+    resampling="idw",
+    profile=None,
 ):
-    da = rotate_domain(da, wind_direction=wind_direction)
-    da = da.transpose("x", "y")
-    output_points = resample(
-        da, query_points=query_points, output_shape=template_xx.shape, workers=workers
-    )
+    if resampling == "idw":
+        output_points = resample(
+            da.transpose("x", "y"),
+            wind_direction=wind_direction,
+            query_points=query_points,
+            output_shape=template_xx.shape,
+            workers=workers,
+            profile=profile,
+        )
+    else:
+        output_points = interpolate(
+            da.transpose("x", "y"),
+            wind_direction=wind_direction,
+            query_points=query_points,
+            output_shape=template_xx.shape,
+            method=resampling,
+        )
     output_ds = xr.DataArray(data=output_points, dims=("x", "y"))
     output_ds = output_ds.assign_coords(x=template_x)
     output_ds = output_ds.assign_coords(y=template_y)
     return output_ds
 
 
+def resample_block(
+    values,
+    *,
+    x,
+    y,
+    wind_direction,
+    query_points,
+    output_shape,
+    method,
+    workers,
+    profile=None,
+):
+    """Resample a block of model-frame grids onto the template grid at once.
+
+    ``values`` holds one (x, y) model-frame grid per timestep and is resampled
+    with the matching entry of ``wind_direction``, using the same engines as
+    :func:`normalize_domain` but on plain arrays.
+    """
+    values = values.reshape(len(values), -1)
+    if method == "idw":
+        output_points = np.empty((len(values), len(query_points)))
+        for i, direction in enumerate(wind_direction):
+            ind, w = idw_weights(
+                x=x,
+                y=y,
+                wind_direction=direction,
+                query_points=query_points,
+                workers=workers,
+                profile=profile,
+            )
+            output_points[i] = np.sum(w * values[i][ind], axis=1)
+    else:
+        # one timestep at a time keeps the (points, 4) weights from growing
+        # with the block
+        output_points = np.empty((len(values), len(query_points)))
+        for i, direction in enumerate(wind_direction):
+            with stage(profile, "rotate") as record:
+                ind, w = record.add(
+                    grid_weights(
+                        x=x,
+                        y=y,
+                        wind_direction=direction,
+                        query_points=query_points,
+                        method=method,
+                    )
+                )
+            output_points[i] = np.nansum(w * values[i][ind], axis=-1)
+    return output_points.reshape((len(values),) + output_shape)
+
+
+def idw_weights(*, x, y, wind_direction, query_points, workers, profile=None):
+    """Indices into the flattened (x, y) model grid and inverse-distance weights
+    of the 4 rotated model grid points nearest to each query point, both with
+    shape (n_points, 4), as in :func:`nearest_weights`."""
+    with stage(profile, "rotate") as record:
+        xx, yy = np.meshgrid(x, y, indexing="ij")
+        rot = -(wind_direction) * np.pi / 180
+        points = record.add(
+            np.array(
+                (
+                    (xx * np.cos(rot) + yy * np.sin(rot)).flatten(),
+                    (-xx * np.sin(rot) + yy * np.cos(rot)).flatten(),
+                )
+            ).transpose()
+        )
+    return nearest_weights(
+        points, query_points=query_points, workers=workers, profile=profile
+    )
+
+
+class ResamplingTable:
+    """Sparse resampling matrices from the model grid to the template grid, one
+    per wind direction bin.
+
+    Rotating and resampling only depend on wind direction and the grids, so
+    with wind directions quantized to ``direction_step`` degrees the weights of
+    each bin are computed once, kept as a (template points, model grid points)
+    sparse matrix, and applied to the footprints of all timesteps in that bin
+    as a sparse matrix product. Matrices are built on first use and the least
+    recently used are dropped beyond ``max_bytes``.
+
+    Parameters
+    ----------
+    x, y : np.ndarray
+        Along-wind and crosswind axes of the model grid.
+    query_points : np.ndarray
+        (n_points, 2) template grid points, as from :func:`build_template`.
+    method : ``idw``, ``bilinear`` or ``nearest``
+        Resampling method, as in :func:`resample_block`.
+    direction_step : float
+        Width in degrees of the wind direction bins.
+    workers : int, optional
+        Workers of the KDTree query that builds ``idw`` weights. Default: 1.
+    max_bytes : int, optional
+        Memory budget of the cached matrices in bytes. Default: 1 GiB.
+    """
+
+    def __init__(
+        self,
+        *,
+        x,
+        y,
+        query_points,
+        method: str,
+        direction_step: float,
+        workers: int = 1,
+        max_bytes: int = 2**30,
+    ):
+        if not 0 < direction_step <= 360:
+            raise ValueError(
+                f"direction_step must be in (0, 360], got {direction_step}."
+            )
+        self.x = x
+        self.y = y
+        self.query_points = query_points
+        self.method = method
+        self.direction_step = direction_step
+        self.bins = max(1, round(360 / direction_step))
+        self.workers = workers
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._matrices = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._matrices)
+
+    def bin(self, wind_direction) -> np.ndarray:
+        """Bin index of each wind direction."""
+        direction = np.asarray(wind_direction) % 360
+        return np.rint(direction / self.direction_step).astype(int) % self.bins
+
+    def matrix(self, index: int) -> "csr_matrix":
+        """Resampling matrix of bin ``index``, built on first use."""
+        from scipy.sparse import csr_matrix
+
+        with self._lock:
+            matrix = self._matrices.get(index)
+            if matrix is not None:
+                self._matrices.move_to_end(index)
+                return matrix
+        direction = index * self.direction_step
+        if self.method == "idw":
+            ind, w = idw_weights(
+                x=self.x,
+                y=self.y,
+                wind_direction=direction,
+                query_points=self.query_points,
+                workers=self.workers,
+            )
+        else:
+            ind, w = grid_weights(
+                x=self.x,
+                y=self.y,
+                wind_direction=direction,
+                query_points=self.query_points,
+                method=self.method,
+            )
+        rows = np.repeat(np.arange(len(ind)), ind.shape[1])
+        matrix = csr_matrix(
+            (w.ravel(), (rows, ind.ravel())),
+            shape=(len(self.query_points), len(self.x) * len(self.y)),
+        )
+        matrix.eliminate_zeros()
+        nbytes = matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes
+        with self._lock:
+            if index not in self._matrices and nbytes <= self.max_bytes:
+                self._matrices[index] = matrix
+                self.nbytes += nbytes
+                while self.nbytes > self.max_bytes:
+                    _, evicted = self._matrices.popitem(last=False)
+                    self.nbytes -= (
+                        evicted.data.nbytes
+                        + evicted.indices.nbytes
+                        + evicted.indptr.nbytes
+                    )
+        return matrix
+
+    def resample(self, values, *, wind_direction, output_shape) -> np.ndarray:
+        """Resample a block of (x, y) model-frame grids onto the template grid
+        with the matrix of each timestep's wind direction bin.
+
+        NaN values are handled as by :func:`resample_block`: gridded methods
+        ignore them and ``idw`` returns NaN wherever they have a weight.
+        """
+        values = values.reshape(len(values), -1)
+        bins = self.bin(wind_direction)
+        output_points = np.empty((len(values), len(self.query_points)))
+        for index in np.unique(bins):
+            rows = np.flatnonzero(bins == index)
+            block = values[rows]
+            missing = np.isnan(block)
+            matrix = self.matrix(index)
+            output = (matrix @ np.where(missing, 0, block).T).T
+            if self.method == "idw" and missing.any():
+                output[(matrix @ missing.T.astype(float)).T > 0] = np.nan
+            output_points[rows] = output
+        return output_points.reshape((len(values),) + output_shape)
+
+
 def build_template(*, domain_length, resolution):
     template_x = np.linspace(
-        -domain_length, domain_length-resolution, (int(domain_length / resolution) * 2)
+        -domain_length,
+        domain_length - resolution,
+        (int(domain_length / resolution) * 2),
     )
     template_y = np.linspace(
-        -domain_length+resolution, domain_length, (int(domain_length / resolution) * 2)
+        -domain_length + resolution,
+        domain_length,
+        (int(domain_length / resolution) * 2),
     )
     template_xx, template_yy = np.meshgrid(template_x, template_y, indexing="xy")
     query_points = np.array((template_xx.flatten(), template_yy.flatten())).transpose()
     return query_points, template_xx, template_yy, template_x, template_y
 
 
+class FootprintGrid:
+    """Model-frame domain, template grid and optional resampling table for one
+    domain length and resolution.
+
+    Nothing in it depends on the site or the measurements, so models of
+    different sites with the same grid settings can share one instance (see
+    :attr:`key`) instead of each building their own.
+    """
+
+    def __init__(
+        self,
+        *,
+        domain_length: int,
+        resolution: int,
+        dtype=np.float64,
+        resampling: str = "idw",
+        direction_step=None,
+        workers: int = 1,
+        spacing="uniform",
+    ):
+        self.domain_length = domain_length
+        self.resolution = resolution
+        self.dtype = np.dtype(dtype)
+        self.resampling = resampling
+        self.direction_step = direction_step
+        self.spacing = spacing
+        self.domain = build_domain(
+            domain_length=domain_length,
+            resolution=resolution,
+            dtype=self.dtype,
+            spacing=spacing,
+        )
+        (
+            self.query_points,
+            self.template_xx,
+            _,
+            self.template_x,
+            self.template_y,
+        ) = build_template(
+            domain_length=domain_length,
+            resolution=resolution,
+        )
+        self.resampling_table = (
+            None
+            if direction_step is None
+            else ResamplingTable(
+                x=self.domain.x.data,
+                y=self.domain.y.data,
+                query_points=self.query_points,
+                method=resampling,
+                direction_step=direction_step,
+                workers=workers,
+            )
+        )
+
+    @property
+    def key(self) -> tuple:
+        """Settings that determine the grid; grids with equal keys are
+        interchangeable."""
+        return self.settings_key(
+            domain_length=self.domain_length,
+            resolution=self.resolution,
+            dtype=self.dtype,
+            resampling=self.resampling,
+            direction_step=self.direction_step,
+            spacing=self.spacing,
+        )
+
+    @staticmethod
+    def settings_key(
+        *, domain_length, resolution, dtype, resampling, direction_step, spacing
+    ) -> tuple:
+        """:attr:`key` of a grid with these settings, without building it."""
+        if not isinstance(spacing, str):
+            spacing = np.asarray(spacing, dtype=np.float64).tobytes()
+        return (
+            domain_length,
+            resolution,
+            np.dtype(dtype).str,
+            resampling,
+            direction_step,
+            spacing,
+        )
+
+
 def sum_one(da):
     sum_da = da.sum(dim="x").sum(dim="y")
     output_ds = da / sum_da
     return output_ds
 
+
+def raster_offsets(shape, *, transform, tower):
+    """Easting and northing of the cell centres of a (rows, cols) raster relative
+    to the tower, as flat arrays in row-major order.
+
+    ``transform`` holds the first six coefficients ``(a, b, c, d, e, f)`` of the
+    raster's affine transform, which maps a column and row to the projected
+    coordinates ``(a * col + b * row + c, d * col + e * row + f)`` as in GDAL and
+    rasterio, and ``tower`` is the (easting, northing) of the tower in the same
+    projected coordinate system, in meters.
+    """
+    a, b, c, d, e, f = tuple(transform)[:6]
+    rows, cols = np.meshgrid(
+        np.arange(shape[0]) + 0.5, np.arange(shape[1]) + 0.5, indexing="ij"
+    )
+    east = a * cols + b * rows + c - tower[0]
+    north = d * cols + e * rows + f - tower[1]
+    return east.ravel(), north.ravel()
+
+
+def raster_cells(east, north, *, shape, transform, tower):
+    """Flat index of the cell of a (rows, cols) raster containing each point at
+    ``east``/``north`` of the tower, or -1 outside the raster."""
+    a, b, c, d, e, f = tuple(transform)[:6]
+    x = east + tower[0] - c
+    y = north + tower[1] - f
+    det = a * e - b * d
+    col = np.floor((e * x - b * y) / det).astype(int)
+    row = np.floor((a * y - d * x) / det).astype(int)
+    inside = (row >= 0) & (row < shape[0]) & (col >= 0) & (col < shape[1])
+    return np.where(inside, row * shape[1] + col, -1)
+
+
+def raster_layers(raster, *, classes=None) -> np.ndarray:
+    """(layer, cell) matrix of a (rows, cols) or (layer, rows, cols) raster, or of
+    the indicator of each of ``classes`` in a categorical (rows, cols) raster.
+    Missing (NaN) values contribute nothing."""
+    raster = np.asarray(raster)
+    if classes is not None:
+        if raster.ndim != 2:
+            raise ValueError("A categorical raster must have shape (rows, cols).")
+        layers = raster == np.asarray(classes)[:, np.newaxis, np.newaxis]
+    elif raster.ndim == 2:
+        layers = raster[np.newaxis]
+    elif raster.ndim == 3:
+        layers = raster
+    else:
+        raise ValueError(f"Expected a 2 or 3 dimensional raster, got {raster.ndim}.")
+    return np.nan_to_num(layers.reshape(len(layers), -1).astype(np.float64))
+
+
+def project_block(Fxy, *, x, y, wind_direction, shape, transform, tower):
+    """Fraction of each footprint of a block of model-frame grids that falls on
+    each cell of a (rows, cols) raster.
+
+    Each raster cell is split into ``n`` by ``n`` equal parts no larger than
+    the crosswind resolution of the model grid, the centre of every part is
+    rotated into the model frame of each timestep (as in :func:`grid_weights`)
+    and the footprint is interpolated bilinearly there. The fraction of the
+    cell is the sum of these values times the area of a part over the integral
+    of the model-frame footprint, so that the fractions of cells covering the
+    whole footprint sum to one however coarse the raster is.
+
+    Returns a (time, cell) array over the flattened raster.
+    """
+    a, b, _, d, e, _ = tuple(transform)[:6]
+    dx = cell_sizes(x)
+    dy = cell_sizes(y)
+    # the x=0 column of the model grid is 0/0 and contributes nothing
+    total = np.nansum(Fxy * dx[:, np.newaxis] * dy[np.newaxis, :], axis=(1, 2))
+    n = int(np.ceil(max(np.hypot(a, d), np.hypot(b, e)) / dy.max() - 1e-9))
+    east, north = raster_offsets(shape, transform=transform, tower=tower)
+    # only cells that can fall into the model domain in some wind direction
+    near = np.flatnonzero(
+        within_reach(east, north, domain_length=x[-1] + dx[-1], transform=transform)
+    )
+    # offsets of the part centres from the cell centre, in columns and rows
+    cols, rows = np.meshgrid(
+        (np.arange(n) + 0.5) / n - 0.5, (np.arange(n) + 0.5) / n - 0.5
+    )
+    query_points = np.stack(
+        [
+            (north[near, np.newaxis] + d * cols.ravel() + e * rows.ravel()).ravel(),
+            (east[near, np.newaxis] + a * cols.ravel() + b * rows.ravel()).ravel(),
+        ],
+        axis=-1,
+    )
+    fractions = np.zeros((len(Fxy), shape[0] * shape[1]))
+    for i, direction in enumerate(wind_direction):
+        ind, w = grid_weights(
+            x=x,
+            y=y,
+            wind_direction=direction,
+            query_points=query_points,
+            method="bilinear",
+        )
+        values = np.nansum(w * Fxy[i].ravel()[ind], axis=-1)
+        fractions[i, near] = values.reshape(len(near), -1).sum(axis=-1)
+        fractions[i] *= abs(a * e - b * d) / n**2 / total[i]
+    return fractions
+
+
+def overlay_block(Fxy, *, x, y, wind_direction, shape, transform, tower, layers):
+    """Footprint weighted sums of ``layers`` for a block of model-frame grids,
+    weighting each raster cell by the fraction of :func:`project_block`.
+
+    Returns a (time, layer) array.
+    """
+    return (
+        project_block(
+            Fxy,
+            x=x,
+            y=y,
+            wind_direction=wind_direction,
+            shape=shape,
+            transform=transform,
+            tower=tower,
+        )
+        @ layers.T
+    )
+
+
+def within_reach(east, north, *, domain_length, transform):
+    """Whether a raster cell centred at ``east``/``north`` of the tower can fall
+    into the model domain in some wind direction."""
+    a, b, _, d, e, _ = tuple(transform)[:6]
+    reach = np.hypot(domain_length, domain_length / 2) + np.hypot(a + b, d + e)
+    return np.hypot(east, north) <= reach
+
+
+class TargetGrid:
+    """North-up georeferenced grid onto which footprints are projected.
+
+    The grid can be in any projected coordinate system in meters: only the
+    position of its cells relative to the tower matters.
+
+    Parameters
+    ----------
+    shape : tuple of int
+        Number of (rows, cols) of the grid.
+    transform : sequence of float
+        Affine transform ``(a, b, c, d, e, f)`` of the grid, as in GDAL and
+        rasterio: ``c``/``f`` are the easting and northing of the corner of the
+        first cell and ``a``/``e`` the width and (usually negative) height of the
+        cells. The rotation terms ``b`` and ``d`` must be zero.
+    tower : tuple of float
+        Easting and northing of the tower in the grid's coordinate system.
+    """
+
+    def __init__(self, shape, *, transform, tower):
+        a, b, c, d, e, f = (float(value) for value in tuple(transform)[:6])
+        if b != 0 or d != 0:
+            raise ValueError("Rotated target grids are not supported.")
+        if a == 0 or e == 0:
+            raise ValueError("The target grid cells must have a nonzero size.")
+        self.shape = tuple(int(n) for n in shape)
+        self.transform = (a, b, c, d, e, f)
+        self.tower = tuple(float(value) for value in tower)
+
+    def __repr__(self):
+        return (
+            f"<TargetGrid shape={self.shape} transform={self.transform} "
+            f"tower={self.tower}>"
+        )
+
+    @property
+    def cell_area(self) -> float:
+        a, _, _, _, e, _ = self.transform
+        return abs(a * e)
+
+    def level_transform(self, factor: int = 1) -> tuple:
+        """Transform of the grid coarsened by ``factor`` in both directions."""
+        a, b, c, d, e, f = self.transform
+        return (a * factor, b, c, d, e * factor, f)
+
+    def coords(self, factor: int = 1) -> tuple:
+        """Northing of the row centres and easting of the column centres of the
+        grid coarsened by ``factor``."""
+        a, _, c, _, e, f = self.level_transform(factor)
+        rows, cols = (-(-n // factor) for n in self.shape)
+        return f + e * (np.arange(rows) + 0.5), c + a * (np.arange(cols) + 0.5)
+
+    def coarsen(self, data, factor: int) -> np.ndarray:
+        """Sum (time, rows, cols) cell fractions over blocks of ``factor`` by
+        ``factor`` cells; partial blocks at the far edges are summed as they
+        are."""
+        rows, cols = self.shape
+        data = np.pad(data, ((0, 0), (0, -rows % factor), (0, -cols % factor)))
+        return data.reshape(
+            len(data),
+            data.shape[1] // factor,
+            factor,
+            data.shape[2] // factor,
+            factor,
+        ).sum(axis=(2, 4))
+
+
+def project(model, target: TargetGrid, *, pyramid=(), block_size: int = 16):
+    """Fraction of each timestep's footprint that falls on each cell of a
+    georeferenced target grid, and optionally on coarsened pyramid levels.
+
+    Model-frame footprints are evaluated in blocks of ``block_size`` timesteps
+    and projected onto the target cells with :func:`project_block`, as in
+    :func:`overlay`. Each block is coarsened into every pyramid
+    level as soon as it is computed.
+
+    Returns a (time, y, x) DataArray, or with ``pyramid`` a Dataset with the
+    full-resolution ``footprint`` and one ``footprint_<factor>`` variable per
+    level on dims ``y_<factor>`` and ``x_<factor>``.
+    """
+    pyramid = [int(factor) for factor in pyramid]
+    if any(factor < 2 for factor in pyramid):
+        raise ValueError(f"Pyramid factors must be integers >= 2, got {pyramid}.")
+    x = model.domain.x.data
+    y = model.domain.y.data
+    ntime = model.ds.sizes["time"]
+    levels = {1: np.full((ntime,) + target.shape, np.nan, dtype=model.dtype)}
+    for factor in pyramid:
+        rows, cols = (-(-n // factor) for n in target.shape)
+        levels[factor] = np.full((ntime, rows, cols), np.nan, dtype=model.dtype)
+    # timesteps whose status is not ok are left NaN
+    valid = np.flatnonzero(model.ds["status"].data == "ok")
+    for start in range(0, len(valid), block_size):
+        steps = valid[start : start + block_size]
+        block = model.ds.isel(time=steps)
+        Fxy = model.calc_model_frame(
+            {name: block[name].data for name in model.parameters}
+        )
+        with stage(model.profile, "project") as record:
+            data = project_block(
+                Fxy,
+                x=x,
+                y=y,
+                wind_direction=block["wind_direction"].data,
+                shape=target.shape,
+                transform=target.transform,
+                tower=target.tower,
+            )
+            data = record.add(
+                data.astype(model.dtype).reshape((len(steps),) + target.shape)
+            )
+        levels[1][steps] = data
+        for factor in pyramid:
+            with stage(model.profile, "coarsen") as record:
+                levels[factor][steps] = record.add(target.coarsen(data, factor))
+    variables = {}
+    for factor, data in levels.items():
+        suffix = "" if factor == 1 else f"_{factor}"
+        northing, easting = target.coords(factor)
+        da = xr.DataArray(data, dims=("time", f"y{suffix}", f"x{suffix}"))
+        da = da.assign_coords(
+            {"time": model.ds.time.data, f"y{suffix}": northing, f"x{suffix}": easting}
+        )
+        da = da.assign_coords(status=("time", model.ds["status"].data))
+        da.attrs = dict(transform=list(target.level_transform(factor)))
+        variables[f"footprint{suffix}"] = da
+    if not pyramid:
+        return variables["footprint"]
+    ds = xr.Dataset(variables)
+    ds.attrs = dict(tower=list(target.tower))
+    return ds
+
+
+def overlay(
+    footprints,
+    raster,
+    *,
+    transform,
+    tower,
+    classes=None,
+    domain_length: int = 1000,
+    resolution: int = 5,
+    block_size: int = 16,
+) -> xr.DataArray:
+    """Footprint weighted sums of a georeferenced raster for every timestep.
+
+    With a categorical raster (e.g. land cover) and its ``classes``, this is the
+    fraction of each timestep's footprint that falls on each class. With one or
+    more continuous layers (e.g. NDVI), it is the footprint weighted sum of each
+    layer. All layers are handled in the same pass over the timesteps.
+
+    Footprints are never rasterized onto the template grid. For
+    :class:`~eddy_footprint.ParametricFootprints`, the model-frame footprint of
+    each timestep is evaluated in blocks of ``block_size`` timesteps and
+    projected onto the raster cells with :func:`project_block`. For
+    :class:`~eddy_footprint.SparseFootprints`, the raster is sampled at the
+    centre of every kept cell, so the sums cover only the kept ``cutoff``
+    fraction.
+
+    Parameters
+    ----------
+    footprints : ParametricFootprints or SparseFootprints
+        Footprints as returned by :func:`calc_footprint` with ``parametric`` or
+        ``cutoff``.
+    raster : np.ndarray
+        Raster with shape (rows, cols), or (layer, rows, cols) for several
+        continuous layers. NaN cells contribute nothing.
+    transform : sequence of float
+        Affine transform ``(a, b, c, d, e, f)`` of the raster, as in GDAL and
+        rasterio, in a projected coordinate system in meters.
+    tower : tuple of float
+        Easting and northing of the tower in the raster's coordinate system.
+    classes : sequence, optional
+        Values of a categorical raster to attribute the footprint to.
+        Default: None (continuous layers).
+    domain_length : int, optional
+        Domain length in meters of the model frame of parametric footprints.
+        Default: 1000.
+    resolution : int, optional
+        Resolution in meters of the model frame of parametric footprints.
+        Default: 5.
+    block_size : int, optional
+        Number of parametric timesteps evaluated together. Default: 16.
+
+    Returns
+    -------
+    da: xarray.DataArray
+        DataArray with dims (time, class) if ``classes`` is given, else
+        (time, layer).
+    """
+    from eddy_footprint.parametric import ParametricFootprints
+    from eddy_footprint.sparse import SparseFootprints
+
+    shape = np.shape(raster)[-2:]
+    layers = raster_layers(raster, classes=classes)
+    if isinstance(footprints, ParametricFootprints):
+        model = footprints.to_model(domain_length=domain_length, resolution=resolution)
+        x = model.domain.x.data
+        y = model.domain.y.data
+        # timesteps whose status is not ok are left NaN
+        valid = np.flatnonzero(model.ds["status"].data == "ok")
+        data = np.full((len(footprints), len(layers)), np.nan)
+        for start in range(0, len(valid), block_size):
+            rows = valid[start : start + block_size]
+            block = model.ds.isel(time=rows)
+            Fxy = model.calc_model_frame(
+                {name: block[name].data for name in model.parameters}
+            )
+            data[rows] = overlay_block(
+                Fxy,
+                x=x,
+                y=y,
+                wind_direction=block["wind_direction"].data,
+                shape=shape,
+                transform=transform,
+                tower=tower,
+                layers=layers,
+            )
+    elif isinstance(footprints, SparseFootprints):
+        position, x_index, y_index, value = footprints.cells()
+        # template rows run along template y (easting) and columns along
+        # template x (northing), see build_template
+        cells = raster_cells(
+            footprints.ds.y.data[x_index],
+            footprints.ds.x.data[y_index],
+            shape=shape,
+            transform=transform,
+            tower=tower,
+        )
+        inside = cells >= 0
+        data = np.stack(
+            [
+                np.bincount(
+                    position[inside],
+                    weights=value[inside] * layer[cells[inside]],
+                    minlength=len(footprints),
+                )
+                for layer in layers
+            ],
+            axis=-1,
+        )
+    else:
+        raise TypeError(
+            "Expected ParametricFootprints or SparseFootprints, got "
+            f"{type(footprints).__name__}."
+        )
+    dim = "layer" if classes is None else "class"
+    da = xr.DataArray(data, dims=("time", dim))
+    da = da.assign_coords(time=footprints.ds.time.data)
+    if classes is not None:
+        da = da.assign_coords({"class": np.asarray(classes)})
+    return da
@@ -0,0 +1,107 @@
+import numpy as np
+import xarray as xr
+from eddy_footprint.spatial import cell_sizes
+
+
+def frame_statistics(Fxy, *, x, y, levels) -> dict:
+    """Peak distance, along-wind extent and source area of a (time, x, y) block
+    of model-frame footprints, as arrays along time keyed by metric name.
+
+    The model frame is the footprint before rotation, so none of the metrics
+    depend on the wind direction. ``levels`` are the fractions of the footprint
+    within the model domain for which the extent and area are computed. Cells
+    are weighted by their area, so the along-wind axis ``x`` may be irregular.
+    """
+    width_x = cell_sizes(x)
+    area = width_x[:, np.newaxis] * cell_sizes(y)[np.newaxis, :]
+    # the x=0 column of the model grid is 0/0 and contributes nothing
+    Fxy = np.nan_to_num(Fxy.reshape(Fxy.shape[0], len(x), len(y)))
+    profile = (Fxy * cell_sizes(y)).sum(axis=2)
+    total = (profile * width_x).sum(axis=1)
+    # cells from the highest footprint density down, with their areas
+    order = np.argsort(-Fxy.reshape(len(Fxy), -1), axis=1)
+    areas = area.ravel()[order]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cumulative = np.cumsum(profile * width_x, axis=1) / total[:, np.newaxis]
+        cells = np.take_along_axis(Fxy.reshape(len(Fxy), -1), order, axis=1)
+        cells = np.cumsum(cells * areas, axis=1) / total[:, np.newaxis]
+    valid = np.isfinite(total) & (total > 0)
+    statistics = {"peak_distance": x[np.argmax(profile, axis=1)]}
+    for level in levels:
+        percent = f"{100 * level:g}"
+        # the first column and the number of densest cells that reach the level
+        column = (cumulative < level).sum(axis=1)
+        count = np.minimum((cells < level).sum(axis=1) + 1, cells.shape[1])
+        statistics[f"extent_{percent}"] = x[np.minimum(column, len(x) - 1)]
+        statistics[f"area_{percent}"] = np.take_along_axis(
+            np.cumsum(areas, axis=1), count[:, np.newaxis] - 1, axis=1
+        )[:, 0]
+    return {
+        name: np.where(valid, value, np.nan).astype(np.float64)
+        for name, value in statistics.items()
+    }
+
+
+def model_statistics(model, *, levels) -> dict:
+    """Footprint statistics of every timestep of ``model`` as arrays along
+    time keyed by metric name, NaN where the status of a timestep is not
+    ``ok``, computed on the model-frame grid in blocks of the model's
+    ``block_size`` timesteps."""
+    levels = np.atleast_1d(levels)
+    if not np.all((levels > 0) & (levels <= 1)):
+        raise ValueError(f"levels must be in (0, 1], got {levels}.")
+    x = model.domain.x.data
+    y = model.domain.y.data
+    names = ["peak_distance"]
+    for level in levels:
+        names += [f"extent_{100 * level:g}", f"area_{100 * level:g}"]
+    valid = np.flatnonzero(model.ds["status"].data == "ok")
+    statistics = {name: np.full(model.ds.sizes["time"], np.nan) for name in names}
+    for start in range(0, len(valid), model.block_size):
+        rows = valid[start : start + model.block_size]
+        block = model.ds.isel(time=rows)
+        Fxy = model.calc_model_frame(
+            {name: block[name].data for name in model.parameters}
+        )
+        for name, value in frame_statistics(Fxy, x=x, y=y, levels=levels).items():
+            statistics[name][rows] = value
+    return statistics
+
+
+def units(name: str) -> str:
+    """Units of the statistic ``name``."""
+    return "m2" if name.startswith("area") else "m"
+
+
+def calc_statistics(model, *, levels=(0.5, 0.7, 0.9)) -> xr.Dataset:
+    """Footprint statistics of every timestep of ``model``.
+
+    Statistics are computed on the model-frame grid in blocks of the model's
+    ``block_size`` timesteps, without rotating or resampling the footprints.
+
+    Parameters
+    ----------
+    model : FootprintModel
+        Footprint model whose timesteps are summarized.
+    levels : sequence of float, optional
+        Fractions of the footprint for which the along-wind extent and the
+        source area are computed. Default: (0.5, 0.7, 0.9).
+
+    Returns
+    -------
+    ds: xarray.Dataset
+        Dataset with one variable per metric along time: ``peak_distance``, the
+        along-wind distance of the maximum of the crosswind-integrated
+        footprint, and for each level P (in percent) ``extent_P``, the along-wind
+        distance within which a fraction P of the footprint lies, and ``area_P``,
+        the area of the smallest source region holding a fraction P.
+    """
+    # timesteps whose status is not ok are left NaN
+    statistics = model_statistics(model, levels=levels)
+    ds = xr.Dataset(
+        coords=dict(time=model.ds.time.data, status=("time", model.ds["status"].data))
+    )
+    for name, value in statistics.items():
+        ds[name] = ("time", value)
+        ds[name].attrs["units"] = units(name)
+    return ds
@@ -0,0 +1,103 @@
+import os
+from typing import Optional
+
+import numpy as np
+import xarray as xr
+
+
+def zarr_encoding(da: xr.DataArray, *, name: str) -> dict:
+    """Encoding that stores each timestep of ``da`` as one chunk of the full
+    (x, y) grid, and datetimes in seconds so later appends keep their precision."""
+    encoding = {name: {"chunks": (1,) + da.shape[1:]}}
+    if np.issubdtype(da.time.dtype, np.datetime64):
+        encoding["time"] = {"units": "seconds since 1970-01-01", "dtype": "int64"}
+    return encoding
+
+
+def has_variable(store, name: str) -> bool:
+    """Whether the Zarr ``store`` exists and holds a variable ``name``."""
+    try:
+        with xr.open_zarr(store) as ds:
+            return name in ds.variables
+    except FileNotFoundError:
+        return False
+
+
+def append_to_zarr(
+    da: xr.DataArray,
+    store,
+    *,
+    name: str = "footprint",
+    exists: Optional[bool] = None,
+):
+    """Append (time, x, y) footprints to the Zarr ``store`` along time, creating
+    the store or the variable on the first write. ``exists`` skips looking up
+    whether the variable was already written."""
+    ds = da.to_dataset(name=name)
+    if exists is None:
+        exists = has_variable(store, name)
+    if exists:
+        ds.to_zarr(store, append_dim="time")
+    else:
+        ds.to_zarr(store, mode="a", encoding=zarr_encoding(da, name=name))
+
+
+def is_netcdf(store) -> bool:
+    return isinstance(store, (str, os.PathLike)) and str(store).endswith(
+        (".nc", ".nc4")
+    )
+
+
+def write_footprints(model, store, *, name: str = "footprint") -> xr.Dataset:
+    """Compute the footprints of ``model`` one chunk of timesteps at a time and
+    write each chunk to ``store`` before computing the next.
+
+    ``store`` is a NetCDF4 file if it is a path ending in ``.nc`` or ``.nc4``, and
+    a Zarr store otherwise; it must not exist yet. Footprints are stored with one
+    compressed chunk per timestep that spans the full (x, y) grid. Returns the
+    store opened lazily.
+    """
+    if is_netcdf(store):
+        return write_netcdf(model, store, name=name)
+    for i, da in enumerate(model.iter_chunks()):
+        ds = da.to_dataset(name=name)
+        if i == 0:
+            ds.to_zarr(store, mode="w-", encoding=zarr_encoding(da, name=name))
+        else:
+            ds.to_zarr(store, append_dim="time")
+    return xr.open_zarr(store)
+
+
+def write_netcdf(model, path, *, name: str = "footprint") -> xr.Dataset:
+    import netCDF4
+
+    if os.path.exists(path):
+        raise FileExistsError(f"{path} already exists.")
+    # xarray writes and encodes the coordinates; the footprints are then
+    # filled in chunk by chunk
+    coords = xr.Dataset(
+        coords=dict(
+            time=model.ds.time.data,
+            x=model.template_x,
+            y=model.template_y,
+            status=("time", model.ds["status"].data),
+        )
+    )
+    coords.to_netcdf(path, engine="netcdf4", format="NETCDF4")
+    shape = (len(model.template_x), len(model.template_y))
+    with netCDF4.Dataset(path, "a") as nc:
+        variable = nc.createVariable(
+            name,
+            model.dtype,
+            ("time", "x", "y"),
+            zlib=True,
+            complevel=4,
+            shuffle=True,
+            chunksizes=(1,) + shape,
+        )
+        start = 0
+        for da in model.iter_chunks():
+            stop = start + da.sizes["time"]
+            variable[start:stop] = da.data
+            start = stop
+    return xr.open_dataset(path, engine="netcdf4")
@@ -1,8 +1,23 @@
-from eddy_footprint import calc_footprint
+from eddy_footprint import (
+    FootprintCache,
+    FootprintProfile,
+    FootprintSession,
+    ParametricFootprints,
+    SparseFootprints,
+    TargetGrid,
+    calc_footprint,
+    calc_sites,
+    iter_footprints,
+)
+import eddy_footprint
+import numpy as np
 import pandas as pd
 import pytest
 import os
+import subprocess
+import sys
 import xarray as xr
+from eddy_footprint.spatial import overlay
 
 
 @pytest.fixture(scope="module")
@@ -53,3 +68,642 @@ def test_kormann_footprint(data):
         method="Kormann & Meixner",
     )
     assert isinstance(da, xr.DataArray)
+
+
+@pytest.fixture(scope="module")
+def series():
+    cp = 1003
+    fp = os.path.join(os.path.dirname(__file__), "data/flux_data_ex.csv")
+    df = pd.read_csv(
+        fp, parse_dates=[1], na_values="NA", delimiter=",", index_col=False
+    )
+    df["Lcalc"] = -(
+        ((df["air_pressure"]) / (287 * (df["air_temperature"] + 273)))
+        * cp
+        * (df["u_"] ** 3)
+        * (273 + df["air_temperature"])
+    ) / (0.41 * 9.8 * df.H)
+    return df
+
+
+def footprint_kwargs(df, **kwargs):
+    return dict(
+        air_pressure=df["air_pressure"],
+        air_temperature=df["air_temperature"],
+        friction_velocity=df["u_"],
+        wind_speed=df["wind_speed"],
+        cross_wind_variance=df["v_var"],
+        wind_direction=df["wind_dir"],
+        monin_obukhov_length=df["Lcalc"],
+        time=df["datetime"],
+        instrument_height=2.5,
+        roughness_length=0.0206,
+        domain_length=200,
+        resolution=5,
+        **kwargs,
+    )
+
+
+def test_climatology_matches_mean_footprint(series):
+    da = calc_footprint(**footprint_kwargs(series))
+    clim = calc_footprint(**footprint_kwargs(series), climatology="all")
+    assert clim.dims == ("x", "y")
+    assert int(clim["count"]) == len(series)
+    xr.testing.assert_allclose(clim.drop_vars(["count", "weight"]), da.mean("time"))
+    assert float(clim.sum()) == pytest.approx(1)
+
+
+def test_weighted_climatology_by_hour(series):
+    weights = series["co2_flux"].to_numpy()
+    da = calc_footprint(**footprint_kwargs(series))
+    clim = calc_footprint(
+        **footprint_kwargs(series), climatology="hour", weights=weights
+    )
+    assert clim.dims == ("hour", "x", "y")
+    assert clim["count"].sum() == len(series)
+    hours = da.time.dt.hour.data
+    expected = (da * xr.DataArray(weights, dims="time")).isel(
+        time=hours == hours[0]
+    ).sum("time") / weights[hours == hours[0]].sum()
+    xr.testing.assert_allclose(
+        clim.sel(hour=hours[0]).drop_vars(["hour", "count", "weight"]), expected
+    )
+    with pytest.raises(ValueError):
+        calc_footprint(
+            **footprint_kwargs(series), climatology="hour", weights=weights[:-1]
+        )
+
+
+def test_stability_climatology_follows_hsieh_regimes(series):
+    df = pd.concat([series.iloc[:1]] * 3, ignore_index=True)
+    df["datetime"] = pd.date_range("2020-01-01", periods=len(df), freq="30min")
+    # zu / L is about 3.2 times z / L here, so z / L = 0.01 is stable in Hsieh
+    df["Lcalc"] = [2.5 / 0.01, -2.5 / 0.01, 1e6]
+    clim = calc_footprint(**footprint_kwargs(df), climatology="stability")
+    assert dict(zip(clim.stability.data, clim["count"].data)) == {
+        "neutral": 1,
+        "stable": 1,
+        "unstable": 1,
+    }
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        dict(store="footprints.zarr", cutoff=0.9),
+        dict(climatology="all", cutoff=0.9),
+        dict(statistics=[0.9], target=None, parametric=True),
+        dict(weights=np.ones(3)),
+        dict(members=10),
+        dict(seed=0),
+        dict(sparse_format="bbox"),
+        dict(pyramid=[2]),
+    ],
+)
+def test_conflicting_output_options_raise(series, options, tmp_path):
+    if "store" in options:
+        options["store"] = str(tmp_path / options["store"])
+    with pytest.raises(ValueError):
+        calc_footprint(**footprint_kwargs(series), **options)
+    assert not any(tmp_path.iterdir())
+
+
+@pytest.mark.parametrize("method", ["Hsieh", "Kormann & Meixner"])
+@pytest.mark.parametrize("resampling, tolerance", [("bilinear", 0.1), ("nearest", 0.2)])
+def test_gridded_resampling_matches_idw(series, method, resampling, tolerance):
+    idw = calc_footprint(**footprint_kwargs(series, method=method))
+    da = calc_footprint(
+        **footprint_kwargs(series, method=method, resampling=resampling)
+    )
+    assert da.dims == idw.dims
+    assert da.sum(("x", "y")).values == pytest.approx(1)
+    # idw extrapolates the model domain edge beyond it, compare where both have data
+    idw = idw.where(da > 0, 0)
+    idw = idw / idw.sum(("x", "y"))
+    assert (abs(da - idw).sum(("x", "y")) < tolerance).all()
+
+
+@pytest.mark.parametrize("method", ["Hsieh", "Kormann & Meixner"])
+@pytest.mark.parametrize("resampling", ["idw", "bilinear"])
+def test_numpy_engine_matches_xarray_engine(series, method, resampling):
+    kwargs = footprint_kwargs(series, method=method, resampling=resampling)
+    expected = calc_footprint(**kwargs)
+    da = calc_footprint(**kwargs, engine="numpy", block_size=2)
+    xr.testing.assert_allclose(da, expected)
+    with pytest.raises(ValueError, match="engine"):
+        calc_footprint(**kwargs, engine="bogus")
+
+
+@pytest.mark.parametrize("executor", ["process", "thread"])
+@pytest.mark.parametrize("engine", ["xarray", "numpy"])
+def test_parallel_matches_serial(series, executor, engine):
+    kwargs = footprint_kwargs(series, engine=engine)
+    expected = calc_footprint(**kwargs)
+    da = calc_footprint(**kwargs, executor=executor, workers=2, chunk_size=2)
+    xr.testing.assert_identical(da, expected)
+
+
+@pytest.mark.parametrize("method", ["Hsieh", "Kormann & Meixner"])
+def test_parametric_rasterizes_to_dense(series, method, tmp_path):
+    kwargs = footprint_kwargs(series, method=method)
+    expected = calc_footprint(**kwargs)
+    compact = calc_footprint(**kwargs, parametric=True)
+    assert isinstance(compact, ParametricFootprints)
+    assert len(compact) == len(series)
+    rasterize = dict(domain_length=200, resolution=5)
+    xr.testing.assert_allclose(compact.rasterize(**rasterize), expected)
+    timestep = expected.time[1]
+    xr.testing.assert_allclose(
+        compact.rasterize(timestep, **rasterize), expected.sel(time=timestep)
+    )
+    coarse = compact.rasterize(expected.time[:2], domain_length=100, resolution=10)
+    assert coarse.shape == (2, 20, 20)
+    compact.ds.to_netcdf(tmp_path / "footprints.nc")
+    with xr.open_dataset(tmp_path / "footprints.nc") as ds:
+        restored = ParametricFootprints(ds.load())
+    xr.testing.assert_allclose(restored.rasterize(**rasterize), expected)
+
+
+@pytest.mark.parametrize("engine", ["xarray", "numpy"])
+def test_cache_serves_repeated_inputs(series, engine):
+    repeated = pd.concat([series, series], ignore_index=True)
+    repeated["datetime"] = pd.date_range(
+        "2019-07-11", periods=len(repeated), freq="30min"
+    )
+    repeated.loc[len(series) :, "u_"] *= 1.0001
+    cache = FootprintCache()
+    kwargs = footprint_kwargs(repeated, engine=engine, resampling="bilinear")
+    da = calc_footprint(**kwargs, cache=cache)
+    stats = cache.stats()
+    assert stats["footprint"]["hits"] == len(series)
+    assert stats["frame"]["misses"] == len(series)
+    np.testing.assert_array_equal(da[: len(series)], da[len(series) :])
+    # quantized to 0.1% in the parameters and 1 degree in wind direction
+    assert (abs(da - calc_footprint(**kwargs)).sum(("x", "y")) < 0.05).all()
+
+
+def test_cache_evicts_beyond_budget(series):
+    cache = FootprintCache(max_bytes=100_000)
+    calc_footprint(**footprint_kwargs(series), cache=cache)
+    assert 0 < len(cache) and cache.nbytes <= 100_000
+
+
+@pytest.mark.parametrize("method", ["Hsieh", "Kormann & Meixner"])
+@pytest.mark.parametrize("engine", ["xarray", "numpy"])
+def test_float32_footprints(series, method, engine):
+    kwargs = footprint_kwargs(series, method=method, engine=engine)
+    expected = calc_footprint(**kwargs)
+    da = calc_footprint(**kwargs, dtype="float32")
+    assert da.dtype == "float32"
+    xr.testing.assert_allclose(da, expected.astype("float32"), rtol=1e-3, atol=1e-7)
+
+
+@pytest.mark.parametrize("method", ["Hsieh", "Kormann & Meixner"])
+@pytest.mark.parametrize("engine", ["xarray", "numpy"])
+def test_separable_matches_direct(series, method, engine):
+    kwargs = footprint_kwargs(series, method=method, engine=engine)
+    expected = calc_footprint(**kwargs)
+    da = calc_footprint(**kwargs, separable=True)
+    xr.testing.assert_allclose(da, expected, rtol=1e-12)
+
+
+@pytest.mark.parametrize("sparse_format", ["coo", "bbox"])
+def test_sparse_footprints_keep_cutoff(series, sparse_format, tmp_path):
+    kwargs = footprint_kwargs(series, resampling="bilinear")
+    expected = calc_footprint(**kwargs)
+    sparse = calc_footprint(**kwargs, cutoff=0.9, sparse_format=sparse_format)
+    assert isinstance(sparse, SparseFootprints)
+    assert sparse.ds.sizes["cell"] < expected[0].size
+    da = sparse.to_dense()
+    assert da.dims == expected.dims
+    assert (da.sum(("x", "y")) >= 0.9 - 1e-12).all()
+    kept = da > 0
+    xr.testing.assert_equal(da.where(kept), expected.where(kept))
+    if sparse_format == "coo":
+        # the dropped cells are the weakest and no more are kept than needed
+        dropped = expected.where(~kept).max(("x", "y"))
+        assert (dropped <= da.where(kept).min(("x", "y"))).all()
+        assert (da.sum(("x", "y")) < 0.9 + expected.max(("x", "y"))).all()
+    sparse.ds.to_netcdf(tmp_path / "sparse.nc")
+    with xr.open_dataset(tmp_path / "sparse.nc") as ds:
+        restored = SparseFootprints(ds.load())
+    timestep = expected.time[1]
+    xr.testing.assert_equal(restored.to_dense(timestep), da.sel(time=timestep))
+
+
+@pytest.mark.parametrize("engine", ["xarray", "numpy"])
+def test_session_appends_match_batch(series, engine, tmp_path):
+    pytest.importorskip("zarr")
+    kwargs = footprint_kwargs(series, engine=engine)
+    expected = calc_footprint(**kwargs)
+    site = {
+        name: kwargs.pop(name)
+        for name in (
+            "instrument_height",
+            "roughness_length",
+            "domain_length",
+            "resolution",
+            "engine",
+        )
+    }
+    store = str(tmp_path / "footprints.zarr")
+    session = FootprintSession(**site, store=store)
+    chunks = [
+        session.append(**{name: value[rows] for name, value in kwargs.items()})
+        for rows in (slice(0, 1), slice(1, None))
+    ]
+    assert len(session) == len(series)
+    assert chunks[0].sizes["time"] == 1
+    xr.testing.assert_allclose(xr.concat(chunks, dim="time"), expected)
+    with xr.open_zarr(store) as ds:
+        xr.testing.assert_allclose(ds["footprint"].load(), expected)
+        assert ds["footprint"].encoding["chunks"] == (1,) + expected.shape[1:]
+
+
+@pytest.mark.parametrize("executor", ["process", "thread"])
+def test_session_keeps_one_pool(series, executor):
+    kwargs = footprint_kwargs(series, engine="numpy")
+    expected = calc_footprint(**kwargs)
+    site = {
+        name: kwargs.pop(name)
+        for name in ("instrument_height", "roughness_length", "domain_length", "engine")
+    }
+    del kwargs["resolution"]
+    chunks, pools = [], []
+    with FootprintSession(
+        **site, executor=executor, workers=2, chunk_size=1
+    ) as session:
+        for rows in (slice(0, 1), slice(1, None)):
+            values = {name: value[rows] for name, value in kwargs.items()}
+            chunks.append(session.append(**values))
+            pools.append(session._pool)
+    assert pools[0] is not None and pools[1] is pools[0]
+    assert session._pool is None
+    xr.testing.assert_allclose(xr.concat(chunks, dim="time"), expected)
+
+
+@pytest.mark.parametrize("filename", ["footprints.zarr", "footprints.nc"])
+def test_store_streams_chunks(series, filename, tmp_path):
+    pytest.importorskip("zarr" if filename.endswith(".zarr") else "netCDF4")
+    kwargs = footprint_kwargs(series, resampling="bilinear", chunk_size=2)
+    expected = calc_footprint(**kwargs)
+    ds = calc_footprint(**kwargs, store=str(tmp_path / filename))
+    assert isinstance(ds, xr.Dataset)
+    xr.testing.assert_allclose(ds["footprint"].load(), expected)
+    chunks = ds["footprint"].encoding["chunksizes" if ".nc" in filename else "chunks"]
+    assert tuple(chunks) == (1,) + expected.shape[1:]
+    ds.close()
+    with pytest.raises(FileExistsError):
+        calc_footprint(**kwargs, store=str(tmp_path / filename))
+
+
+def template_raster(da):
+    """Categorical raster on the template grid of ``da``, north up, with its
+    transform and the same classes in template (x, y) order."""
+    resolution = float(da.x[1] - da.x[0])
+    east = da.y.data  # template rows run along easting, see overlay
+    north = da.x.data
+    transform = (
+        resolution,
+        0,
+        east[0] - resolution / 2,
+        0,
+        -resolution,
+        north[-1] + resolution / 2,
+    )
+    # one class per quadrant, so that misplacing footprints shows
+    classes = (east[:, np.newaxis] > 0) + 2 * (north[np.newaxis, :] > 0)
+    return classes.T[::-1], transform, classes
+
+
+@pytest.mark.parametrize("source", ["parametric", "sparse"])
+def test_overlay_matches_dense_footprints(series, source):
+    kwargs = footprint_kwargs(series, resampling="bilinear")
+    expected = calc_footprint(**kwargs)
+    raster, transform, classes = template_raster(expected)
+    if source == "parametric":
+        footprints = calc_footprint(**kwargs, parametric=True)
+        tolerance = 0.02
+    else:
+        footprints = calc_footprint(**kwargs, cutoff=0.9)
+        expected = footprints.to_dense()
+        tolerance = 1e-12
+    da = overlay(
+        footprints,
+        raster,
+        transform=transform,
+        tower=(0, 0),
+        classes=[0, 1, 2, 3],
+        domain_length=200,
+    )
+    assert da.dims == ("time", "class")
+    for i in range(4):
+        fraction = expected.where(classes == i).sum(("x", "y"))
+        np.testing.assert_allclose(da.sel({"class": i}), fraction, atol=tolerance)
+    # continuous layers give the same sums in one pass
+    layers = overlay(
+        footprints,
+        np.stack([raster == i for i in range(4)]),
+        transform=transform,
+        tower=(0, 0),
+        domain_length=200,
+    )
+    np.testing.assert_allclose(layers.data, da.data)
+
+
+@pytest.mark.parametrize("cell", [30, 100])
+def test_overlay_integrates_coarse_raster_cells(series, cell):
+    kwargs = footprint_kwargs(series, resampling="bilinear")
+    footprints = calc_footprint(**kwargs, parametric=True)
+    # a raster coarser than the model resolution, offset from the tower
+    n = 400 // cell + 2
+    transform = (cell, 0, -cell * n / 2 + 3, 0, -cell, cell * n / 2 - 7)
+    da = overlay(
+        footprints,
+        np.ones((n, n)),
+        transform=transform,
+        tower=(0, 0),
+        domain_length=200,
+    )
+    np.testing.assert_allclose(da.sel(layer=0), 1, rtol=0.01)
+
+
+@pytest.mark.parametrize("method", ["Hsieh", "Kormann & Meixner"])
+def test_statistics_match_dense_footprints(series, method):
+    kwargs = footprint_kwargs(series, method=method, resampling="bilinear")
+    ds = calc_footprint(**kwargs, statistics=[0.5, 0.9])
+    assert list(ds.data_vars) == [
+        "peak_distance",
+        "extent_50",
+        "area_50",
+        "extent_90",
+        "area_90",
+    ]
+    assert (ds["extent_50"] <= ds["extent_90"]).all()
+    assert (ds["area_50"] < ds["area_90"]).all()
+    # the source areas of the rotated footprints agree up to resampling
+    da = calc_footprint(**kwargs)
+    for level in (0.5, 0.9):
+        cells = -np.sort(-da.data.reshape(len(da), -1), axis=1)
+        count = (np.cumsum(cells, axis=1) < level).sum(axis=1) + 1
+        np.testing.assert_allclose(ds[f"area_{level * 100:g}"], count * 25, rtol=0.1)
+
+
+@pytest.mark.parametrize("engine", ["xarray", "numpy"])
+def test_invalid_inputs_are_skipped(series, engine):
+    df = pd.concat([series.iloc[:1]] * 6, ignore_index=True)
+    df["datetime"] = pd.date_range("2020-01-01", periods=len(df), freq="30min")
+    df.loc[1, "u_"] = np.nan
+    df.loc[2, "v_var"] = -1
+    df.loc[3, "Lcalc"] = 0
+    df.loc[4, "wind_dir"] = 400
+    df.loc[5, "v_var"] = 0
+    kwargs = footprint_kwargs(df, engine=engine, resampling="bilinear")
+    da = calc_footprint(**kwargs)
+    assert da.status.data.tolist() == [
+        "ok",
+        "missing",
+        "cross_wind_variance",
+        "monin_obukhov_length",
+        "wind_direction",
+        "cross_wind_variance",
+    ]
+    assert da[1:].isnull().all()
+    expected = calc_footprint(**footprint_kwargs(df[:1], resampling="bilinear"))
+    xr.testing.assert_allclose(da[:1], expected)
+    ds = calc_footprint(**kwargs, statistics=[0.9])
+    assert ds["area_90"][1:].isnull().all() and ds["area_90"][0].notnull()
+    sparse = calc_footprint(**kwargs, cutoff=0.9).to_dense()
+    assert sparse[1:].isnull().all() and sparse[0].notnull().all()
+
+
+@pytest.mark.parametrize("resampling", ["idw", "bilinear", "nearest"])
+@pytest.mark.parametrize("engine", ["xarray", "numpy"])
+def test_resampling_table_matches_exact_directions(series, resampling, engine):
+    df = series.assign(wind_dir=series["wind_dir"].round())
+    kwargs = footprint_kwargs(df, resampling=resampling, engine=engine)
+    expected = calc_footprint(**kwargs)
+    da = calc_footprint(**kwargs, direction_step=1)
+    xr.testing.assert_allclose(da, expected, rtol=1e-10, atol=1e-12)
+    # other directions fall into the nearest bin
+    shifted = footprint_kwargs(
+        df.assign(wind_dir=df["wind_dir"] + 0.3),
+        resampling=resampling,
+        engine=engine,
+        direction_step=1,
+    )
+    xr.testing.assert_allclose(calc_footprint(**shifted), da)
+
+
+def test_idw_engines_match_on_grid_directions(series):
+    # at multiples of 90 degrees, template points land on model grid points
+    df = pd.concat([series.iloc[:1]] * 4, ignore_index=True)
+    df["datetime"] = pd.date_range("2020-01-01", periods=len(df), freq="30min")
+    df["wind_dir"] = [0, 90, 180, 270]
+    kwargs = footprint_kwargs(df)
+    expected = calc_footprint(**kwargs)
+    xr.testing.assert_allclose(calc_footprint(**kwargs, engine="numpy"), expected)
+    xr.testing.assert_allclose(calc_footprint(**kwargs, direction_step=1), expected)
+
+
+@pytest.mark.parametrize("executor", [None, "thread", "process"])
+def test_sites_match_single_site_calls(series, executor):
+    sites = {
+        "tower": footprint_kwargs(series),
+        "mast": footprint_kwargs(series, method="Kormann & Meixner"),
+        "coarse": {**footprint_kwargs(series), "resolution": 10},
+    }
+    sites["mast"]["instrument_height"] = 4.0
+    result = calc_sites(
+        sites, resampling="bilinear", executor=executor, workers=2, chunk_size=2
+    )
+    assert list(result) == list(sites)
+    for site, kwargs in sites.items():
+        expected = calc_footprint(**kwargs, resampling="bilinear")
+        xr.testing.assert_allclose(result[site], expected)
+
+
+def test_log_spacing_matches_fine_grid(series):
+    kwargs = footprint_kwargs(series, resampling="bilinear")
+    reference = calc_footprint(**kwargs, spacing=np.arange(0.05, 195.01, 0.05))
+    uniform = calc_footprint(**kwargs)
+    log = calc_footprint(**kwargs, spacing="log")
+
+    def error(da):
+        return float(np.abs(da - reference).sum(("x", "y")).max())
+
+    # fewer along-wind cells than the uniform grid at about the same accuracy
+    assert error(log) < 1.1 * error(uniform)
+    statistics = calc_footprint(**kwargs, spacing="log", statistics=[0.9])
+    expected = calc_footprint(
+        **kwargs, spacing=np.arange(0.05, 195.01, 0.05), statistics=[0.9]
+    )
+    np.testing.assert_allclose(statistics["area_90"], expected["area_90"], rtol=0.1)
+    with pytest.raises(ValueError):
+        calc_footprint(**kwargs, spacing=[0, 10, 5])
+
+
+class RecordCalls:
+    """Profile callback that keeps its calls; picklable, unlike a lambda, so
+    it reaches process pools under any start method."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, *record):
+        self.calls.append(record)
+
+
+@pytest.mark.parametrize(
+    "engine, executor, stages",
+    [
+        ("xarray", None, {"rotate", "kdtree_build", "kdtree_query", "sum_one"}),
+        ("numpy", None, {"calc_Fx", "calc_Dxy", "kdtree_query", "normalize"}),
+        ("numpy", "process", {"calc_parameters", "kdtree_query", "normalize"}),
+    ],
+)
+def test_profile_records_stages(series, engine, executor, stages):
+    kwargs = footprint_kwargs(series, engine=engine)
+    callback = RecordCalls()
+    profile = FootprintProfile(callback=callback)
+    da = calc_footprint(
+        **kwargs, profile=profile, executor=executor, workers=2, chunk_size=2
+    )
+    xr.testing.assert_identical(da, calc_footprint(**kwargs))
+    report = profile.to_dataset()
+    assert stages <= set(report.stage.data)
+    assert int(report["calls"].sel(stage="calc_Fxy")) >= 1
+    assert int(report["bytes"].sel(stage="resample")) >= da.nbytes
+    assert (report["seconds"] >= 0).all()
+    if executor is None:
+        assert len(callback.calls) == int(report["calls"].sum())
+
+
+@pytest.mark.parametrize("engine", ["xarray", "numpy"])
+@pytest.mark.parametrize("executor", [None, "thread"])
+def test_iter_footprints_matches_batch(series, engine, executor):
+    kwargs = footprint_kwargs(series, engine=engine)
+    kwargs["monin_obukhov_length"] = kwargs["monin_obukhov_length"].where(
+        series.index != 1
+    )
+    expected = calc_footprint(**kwargs)
+    profile = FootprintProfile()
+    footprints = iter_footprints(**kwargs, block_size=2, profile=profile)
+    first = next(footprints)
+    # only the first timestep (or block) is computed before it is yielded
+    assert int(profile.to_dataset()["calls"].sel(stage="calc_Fxy")) == 1
+    assert first.dims == ("x", "y")
+    da = xr.concat([first, *footprints], dim="time")
+    xr.testing.assert_identical(da, expected)
+    chunks = list(iter_footprints(**kwargs, chunk_size=2, executor=executor, workers=2))
+    assert max(chunk.sizes["time"] for chunk in chunks) == 2
+    xr.testing.assert_identical(xr.concat(chunks, dim="time"), expected)
+    with pytest.raises(ValueError):
+        iter_footprints(**kwargs, method="Gaussian")
+
+
+def test_target_grid_matches_template(series):
+    kwargs = footprint_kwargs(series, resampling="bilinear")
+    kwargs["monin_obukhov_length"] = kwargs["monin_obukhov_length"].where(
+        series.index != 1
+    )
+    dense = calc_footprint(**kwargs)
+    raster, transform, _ = template_raster(dense)
+    target = TargetGrid(raster.shape, transform=transform, tower=(0, 0))
+    da = calc_footprint(**kwargs, target=target)
+    assert da.dims == ("time", "y", "x")
+    np.testing.assert_allclose(da.x, dense.y)
+    np.testing.assert_allclose(da.y, dense.x[::-1])
+    # template rows run along easting and its columns along northing
+    expected = dense.data.transpose(0, 2, 1)[:, ::-1]
+    np.testing.assert_allclose(da.data, expected, rtol=0.02, atol=1e-6)
+    assert list(da.status.data) == list(dense.status.data)
+    ds = calc_footprint(**kwargs, target=target, pyramid=[2, 4, 8])
+    xr.testing.assert_identical(ds["footprint"].rename(None), da)
+    for factor in (2, 4, 8):
+        level = ds[f"footprint_{factor}"]
+        assert level.shape[1:] == tuple(-(-n // factor) for n in raster.shape)
+        np.testing.assert_allclose(
+            level.sum((f"y_{factor}", f"x_{factor}")), da.sum(("y", "x"))
+        )
+    # the shifted tower moves the footprint by whole cells
+    shifted = TargetGrid(raster.shape, transform=transform, tower=(10, 0))
+    moved = calc_footprint(**kwargs, target=shifted)
+    np.testing.assert_allclose(moved[:, :, 2:].data, da[:, :, :-2].data)
+    with pytest.raises(ValueError):
+        TargetGrid(raster.shape, transform=(5, 1, 0, 0, -5, 0), tower=(0, 0))
+    with pytest.raises(ValueError):
+        calc_footprint(**kwargs, pyramid=[2])
+
+
+@pytest.mark.parametrize("cell", [30, 250])
+def test_target_grid_integrates_coarse_cells(series, cell):
+    kwargs = footprint_kwargs(series, resampling="bilinear")
+    n = 400 // cell + 2
+    transform = (cell, 0, -cell * n / 2 + 3, 0, -cell, cell * n / 2 - 7)
+    target = TargetGrid((n, n), transform=transform, tower=(0, 0))
+    da = calc_footprint(**kwargs, target=target)
+    np.testing.assert_allclose(da.sum(("y", "x")), 1, rtol=0.01)
+
+
+def test_import_is_lazy():
+    # worker processes import the package before knowing what they will use
+    code = (
+        "import sys, eddy_footprint; "
+        "print(' '.join(m for m in ('xarray', 'pandas', 'scipy') if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    assert result.stdout.strip() == ""
+    assert "calc_sites" in dir(eddy_footprint)
+    assert eddy_footprint.calc_footprint is calc_footprint
+    with pytest.raises(AttributeError):
+        eddy_footprint.calc_footprints
+
+
+@pytest.mark.parametrize("method", ["Hsieh", "Kormann & Meixner"])
+def test_ensemble_matches_member_runs(series, method):
+    kwargs = footprint_kwargs(series, method=method, resampling="bilinear")
+    kwargs["monin_obukhov_length"] = kwargs["monin_obukhov_length"].where(
+        series.index != 1
+    )
+    # two members per timestep, at the measured and a veered wind direction
+    directions = np.stack(
+        [series["wind_dir"], (series["wind_dir"] + 20) % 360], axis=-1
+    )
+    ds = calc_footprint(**kwargs, ensemble={"wind_direction": directions}, block_size=3)
+    runs = [
+        calc_footprint(**{**kwargs, "wind_direction": directions[:, i]})
+        for i in range(2)
+    ]
+    assert list(ds.status.data) == list(runs[0].status.data)
+    assert list(ds["members"].data) == [2, 0, 2]
+    ds = ds.drop_vars("status")
+    runs = [run.drop_vars("status") for run in runs]
+    xr.testing.assert_allclose(ds["mean"], (runs[0] + runs[1]) / 2)
+    xr.testing.assert_allclose(ds["std"], abs(runs[0] - runs[1]) / 2, atol=1e-12)
+    statistics = calc_footprint(
+        **kwargs,
+        ensemble={"friction_velocity": 0.05},
+        members=20,
+        seed=0,
+        statistics=[0.9],
+    )
+    assert statistics["area_90"].dims == ("time", "member")
+    assert statistics["area_90"].shape == (len(series), 20)
+    expected = calc_footprint(**kwargs, statistics=[0.9])
+    # members spread around the unperturbed footprint
+    np.testing.assert_allclose(
+        statistics["area_90"].median("member"), expected["area_90"], rtol=0.2
+    )
+    repeated = calc_footprint(
+        **kwargs,
+        ensemble={"friction_velocity": 0.05},
+        members=20,
+        seed=0,
+        statistics=[0.9],
+    )
+    xr.testing.assert_identical(statistics, repeated)
+    with pytest.raises(ValueError):
+        calc_footprint(**kwargs, ensemble={"air_pressure": 10.0}, members=2)
@@ -0,0 +1,143 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+from eddy_footprint import SparseFootprints, calc_footprint
+from eddy_footprint.cli import main, process
+
+DATA = os.path.join(os.path.dirname(__file__), "data/flux_data_ex.csv")
+
+CONFIG = {
+    "instrument_height": 2.5,
+    "roughness_length": 0.0206,
+    "columns": {
+        "time": "datetime",
+        "friction_velocity": "u_",
+        "cross_wind_variance": "v_var",
+        "wind_direction": "wind_dir",
+        "sensible_heat_flux": "H",
+        "weights": "co2_flux",
+    },
+    "options": {"domain_length": 200, "resolution": 5, "resampling": "bilinear"},
+    "read_csv": {"na_values": "NA"},
+}
+
+
+@pytest.fixture(scope="module")
+def expected_kwargs():
+    df = pd.read_csv(DATA, parse_dates=[1], na_values="NA")
+    # L as derived in test_calc_footprint.py
+    L = -(
+        ((df["air_pressure"]) / (287 * (df["air_temperature"] + 273)))
+        * 1003
+        * (df["u_"] ** 3)
+        * (273 + df["air_temperature"])
+    ) / (0.41 * 9.8 * df.H)
+    return (
+        dict(
+            air_pressure=df["air_pressure"],
+            air_temperature=df["air_temperature"],
+            friction_velocity=df["u_"],
+            wind_speed=df["wind_speed"],
+            cross_wind_variance=df["v_var"],
+            wind_direction=df["wind_dir"],
+            monin_obukhov_length=L,
+            time=df["datetime"],
+            instrument_height=2.5,
+            roughness_length=0.0206,
+            domain_length=200,
+            resolution=5,
+            resampling="bilinear",
+        ),
+        df["co2_flux"].to_numpy(),
+    )
+
+
+def test_dense_output_matches_calc_footprint(expected_kwargs, tmp_path):
+    kwargs, _ = expected_kwargs
+    output = str(tmp_path / "footprints.zarr")
+    summary = process(CONFIG, [DATA, DATA], output=output, chunk_rows=2, chunk_size=1)
+    assert summary["rows"] == 6
+    with xr.open_zarr(output) as ds:
+        da = ds["footprint"].load()
+    expected = calc_footprint(**kwargs)
+    xr.testing.assert_allclose(da.isel(time=slice(0, 3)), expected)
+    xr.testing.assert_allclose(da.isel(time=slice(3, 6)), expected)
+    with pytest.raises(FileExistsError):
+        process(CONFIG, [DATA], output=output)
+
+
+def test_sparse_output_appends_chunks(expected_kwargs, tmp_path):
+    kwargs, _ = expected_kwargs
+    output = str(tmp_path / "sparse.zarr")
+    process(CONFIG, [DATA], output=output, kind="sparse", chunk_rows=2, cutoff=0.8)
+    sparse = SparseFootprints(xr.open_zarr(output).load())
+    expected = calc_footprint(**kwargs, cutoff=0.8)
+    xr.testing.assert_allclose(sparse.to_dense(), expected.to_dense())
+
+
+@pytest.mark.parametrize("climatology", ["all", "hour"])
+def test_climatology_output_merges_chunks(expected_kwargs, climatology, tmp_path):
+    kwargs, weights = expected_kwargs
+    output = str(tmp_path / "climatology.nc")
+    config = dict(CONFIG, options={**CONFIG["options"], "climatology": climatology})
+    config_path = tmp_path / "config.json"
+    config_path.write_text(json.dumps(config))
+    main(
+        [
+            str(config_path),
+            DATA,
+            "-o",
+            output,
+            "--kind",
+            "climatology",
+            "--chunk-rows",
+            "1",
+            "-q",
+        ]
+    )
+    with xr.open_dataset(output) as ds:
+        da = ds["footprint"].load()
+    expected = calc_footprint(**kwargs, climatology=climatology, weights=weights)
+    xr.testing.assert_allclose(da, expected)
+    np.testing.assert_array_equal(da["count"], expected["count"])
+
+
+def test_kind_follows_cutoff_and_climatology(expected_kwargs, tmp_path):
+    kwargs, _ = expected_kwargs
+    config_path = tmp_path / "config.json"
+    config_path.write_text(json.dumps(CONFIG))
+    output = str(tmp_path / "sparse.zarr")
+    main([str(config_path), DATA, "-o", output, "--cutoff", "0.8", "-q"])
+    sparse = SparseFootprints(xr.open_zarr(output).load())
+    expected = calc_footprint(**kwargs, cutoff=0.8)
+    xr.testing.assert_allclose(sparse.to_dense(), expected.to_dense())
+    with pytest.raises(ValueError):
+        process(
+            CONFIG, [DATA], output=str(tmp_path / "a.zarr"), kind="dense", cutoff=0.8
+        )
+    with pytest.raises(ValueError):
+        process(
+            CONFIG,
+            [DATA],
+            output=str(tmp_path / "b.zarr"),
+            cutoff=0.8,
+            climatology="all",
+        )
+    with pytest.raises(SystemExit) as err:
+        main(
+            [str(config_path), DATA, "-o", str(tmp_path / "c.zarr")]
+            + ["--kind", "sparse", "--climatology", "all", "-q"]
+        )
+    assert err.value.code == 1
+    for name, value in [
+        ("statistics", [0.9]),
+        ("store", "x.zarr"),
+        ("parametric", True),
+    ]:
+        config = dict(CONFIG, options={**CONFIG["options"], name: value})
+        with pytest.raises(ValueError):
+            process(config, [DATA], output=str(tmp_path / "d.zarr"))
@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+from eddy_footprint.spatial import build_domain, grid_weights
+
+
+@pytest.mark.parametrize("method", ["bilinear", "nearest"])
+def test_grid_weights_reproduce_grid_nodes(method):
+    domain = build_domain(domain_length=100, resolution=5)
+    values = np.random.default_rng(0).random((domain.sizes["x"], domain.sizes["y"]))
+    xx, yy = np.meshgrid(domain.x, domain.y, indexing="ij")
+    query_points = np.array((xx.flatten(), yy.flatten())).transpose()
+    ind, w = grid_weights(
+        x=domain.x.data,
+        y=domain.y.data,
+        wind_direction=0,
+        query_points=query_points,
+        method=method,
+    )
+    np.testing.assert_allclose(
+        np.sum(w * values.flatten()[ind], axis=1), values.flatten()
+    )
+
+
+def test_grid_weights_follow_rotation():
+    domain = build_domain(domain_length=100, resolution=5)
+    # a point 50 m downwind ends up 50 m along the wind direction
+    query_points = np.array([[0.0, 50.0], [50.0, 0.0]])
+    ind, w = grid_weights(
+        x=domain.x.data,
+        y=domain.y.data,
+        wind_direction=90,
+        query_points=query_points,
+        method="nearest",
+    )
+    assert w[:, 0].tolist() == [1.0, 0.0]
+    x_index, y_index = np.divmod(ind[0, 0], len(domain.y))
+    assert domain.x[x_index] == 50
+    assert domain.y[y_index] == 0